@@ -0,0 +1,84 @@
+"""Import-time budget check for the utilities package.
+
+This script imports every utilities module in a fresh interpreter with
+`python -X importtime`, after numpy, pandas and xarray are already loaded,
+and checks that:
+
+    * the cumulative import time of the module itself stays within its
+        budget, and
+
+    * no heavy optional dependency (scipy.stats, statsmodels, matplotlib,
+        dask) is imported at module load.
+
+It exits with a non-zero status if any module breaks its budget, so it
+can be run before committing:
+
+    python scripts/check_import_time.py
+"""
+
+import os
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules already needed by every analysis, excluded from the budgets
+PRELOAD = ['numpy', 'pandas', 'xarray']
+
+# modules that must only be imported on first use
+HEAVY = ['scipy.stats', 'scipy.special', 'statsmodels', 'matplotlib', 'dask']
+
+# cumulative import time budget of each module in milliseconds
+DEFAULT_BUDGET_MS = 50
+BUDGETS_MS = {}
+
+
+def utilities_modules():
+    """Return the names of the modules of the utilities package."""
+    basedir = os.path.join(REPO, 'utilities')
+    return sorted(f'utilities.{f[:-3]}' for f in os.listdir(basedir)
+                  if f.endswith('.py') and f != '__init__.py')
+
+
+def import_profile(module):
+    """Import module in a fresh interpreter and parse -X importtime.
+
+    Returns
+    -------
+    dict
+        {imported module: cumulative import time in microseconds}.
+    """
+    code = f'import {", ".join(PRELOAD)}; import {module}'
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=REPO, capture_output=True, text=True,
+                          check=True)
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def main():
+    failed = False
+    for module in utilities_modules():
+        profile = import_profile(module)
+        elapsed_ms = profile.get(module, 0)/1000
+        budget_ms = BUDGETS_MS.get(module, DEFAULT_BUDGET_MS)
+        heavy = sorted(name for name in profile
+                       if any(name == h or name.startswith(h + '.')
+                              for h in HEAVY))
+        ok = elapsed_ms <= budget_ms and not heavy
+        failed |= not ok
+        status = 'ok' if ok else 'FAIL'
+        print(f'{status:4} {module:32} {elapsed_ms:8.1f} ms '
+              f'(budget {budget_ms} ms)')
+        if heavy:
+            print(f'     imports heavy modules: {", ".join(heavy)}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Gamma quantile-mapping bias correction.
+
+This module provides a vectorized version of the gamma quantile mapping
+used in the frequency-change scripts, so that it can be applied to full
+gridded LENS precipitation fields. Distributions are mixed: a probability
+of dry values plus a gamma distribution (location fixed at zero) for wet
+values. It contains the following main functions:
+
+    * gamma_stats: Compute the sufficient statistics of the mixed gamma
+        distribution along the given dimensions.
+
+    * gamma_params: Compute maximum likelihood gamma parameters (floc=0)
+        from sufficient statistics.
+
+    * quantile_map: Map values from the modeled to the observed
+        distribution.
+
+    * fit_transfer: Fit per-gridpoint (and optionally per-month) transfer
+        functions over a calibration period.
+
+    * apply_transfer: Apply fitted transfer functions to a (possibly
+        dask-backed) modeled field.
+
+    * correct_to_netcdf: Stream a bias-corrected field to a netCDF file
+        chunk by chunk.
+"""
+
+import numpy as np
+import xarray as xr
+
+
+def gamma_stats(da, dim, wet=0.0):
+    """Compute the sufficient statistics of the mixed gamma distribution.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Precipitation data.
+    dim : str or list of str
+        Dimensions to reduce.
+    wet : float, optional
+        Values less or equal than wet are considered dry. Default is 0.
+
+    Returns
+    -------
+    xr.Dataset
+        n (valid values), n_wet (wet values), sum and sumlog (sum of values
+        and of their logarithm over wet values).
+    """
+    is_wet = da > wet
+    wet_da = da.where(is_wet)
+    return xr.Dataset({'n': da.notnull().sum(dim),
+                       'n_wet': is_wet.sum(dim),
+                       'sum': wet_da.sum(dim),
+                       'sumlog': np.log(wet_da).sum(dim)})
+
+
+def gamma_params(stats, niter=10):
+    """Compute maximum likelihood gamma parameters from sufficient
+    statistics.
+
+    The shape parameter solves log(a) - digamma(a) = log(mean) - mean(log),
+    the same equation solved by scipy.stats.gamma.fit with floc=0, using
+    Thom's approximation as first guess and Newton iterations.
+
+    Parameters
+    ----------
+    stats : xr.Dataset
+        Sufficient statistics as returned by gamma_stats.
+    niter : int, optional
+        Number of Newton iterations. Default is 10.
+
+    Returns
+    -------
+    xr.Dataset
+        shape and scale of the wet-value gamma distribution and p0, the
+        probability of dry values.
+    """
+    from scipy.special import digamma, polygamma  # deferred, slow to import
+    mean = stats['sum']/stats['n_wet']
+    s = np.log(mean) - stats['sumlog']/stats['n_wet']
+    s = s.clip(min=1e-12)
+    a = (3 - s + np.sqrt((s - 3)**2 + 24*s))/(12*s)
+    for _ in range(niter):
+        f = np.log(a) - digamma(a) - s
+        df = 1/a - polygamma(1, a)
+        a = (a - f/df).clip(min=1e-6)
+    p0 = 1 - stats['n_wet']/stats['n']
+    return xr.Dataset({'shape': a, 'scale': mean/a, 'p0': p0})
+
+
+def quantile_map(x, mod_shape, mod_scale, mod_p0, obs_shape, obs_scale,
+                 obs_p0, wet=0.0):
+    """Map values from the modeled to the observed mixed gamma distribution.
+
+    All arguments are broadcast against each other. Dry modeled values are
+    mapped to zero and wet modeled values whose non-exceedance probability
+    falls within the observed dry fraction are mapped to zero as well.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Modeled values.
+    mod_shape, mod_scale, mod_p0 : np.ndarray
+        Modeled distribution parameters.
+    obs_shape, obs_scale, obs_p0 : np.ndarray
+        Observed distribution parameters.
+    wet : float, optional
+        Values less or equal than wet are considered dry. Default is 0.
+
+    Returns
+    -------
+    np.ndarray
+        Corrected values.
+    """
+    from scipy.stats import gamma  # deferred, slow to import
+    p = mod_p0 + (1 - mod_p0)*gamma.cdf(x, mod_shape, scale=mod_scale)
+    q = ((p - obs_p0)/(1 - obs_p0)).clip(0, 1)
+    corrected = gamma.ppf(q, obs_shape, scale=obs_scale)
+    return np.where((x > wet) & (p > obs_p0), corrected,
+                    np.where(np.isnan(x), np.nan, 0.0))
+
+
+def fit_transfer(mod, obs, ini_year='1921', end_year='2020', by_month=False,
+                 wet=0.0):
+    """Fit per-gridpoint transfer functions over a calibration period.
+
+    Only sufficient statistics are reduced over the modeled field, so a
+    dask-backed input is processed chunk by chunk with bounded memory.
+
+    Parameters
+    ----------
+    mod : xr.DataArray
+        Modeled precipitation. [time x run x lat x lon]
+    obs : xr.DataArray
+        Observed precipitation on the same grid. [time x lat x lon]
+    ini_year, end_year : str, optional
+        Calibration period. Default is 1921-2020.
+    by_month : bool, optional
+        If True, fit one transfer function per calendar month.
+    wet : float, optional
+        Values less or equal than wet are considered dry. Default is 0.
+
+    Returns
+    -------
+    xr.Dataset
+        mod_shape, mod_scale, mod_p0, obs_shape, obs_scale and obs_p0.
+        [lat x lon] or [month x lat x lon]
+    """
+    mod = mod.sel(time=slice(ini_year, end_year))
+    obs = obs.sel(time=slice(ini_year, end_year))
+    mod_dims = [d for d in mod.dims if d not in ('lat', 'lon')]
+    if by_month:
+        mod_stats = mod.groupby('time.month').map(gamma_stats, dim=mod_dims,
+                                                   wet=wet)
+        obs_stats = obs.groupby('time.month').map(gamma_stats, dim='time',
+                                                   wet=wet)
+    else:
+        mod_stats = gamma_stats(mod, mod_dims, wet=wet)
+        obs_stats = gamma_stats(obs, 'time', wet=wet)
+    mod_params = gamma_params(mod_stats.compute())
+    obs_params = gamma_params(obs_stats.compute())
+    params = xr.merge([mod_params.rename({k: f'mod_{k}' for k in mod_params}),
+                       obs_params.rename({k: f'obs_{k}' for k in obs_params})])
+    params.attrs.update(calibration=f'{ini_year}-{end_year}', wet=wet)
+    return params
+
+
+def apply_transfer(mod, params):
+    """Apply fitted transfer functions to a modeled field.
+
+    Parameters
+    ----------
+    mod : xr.DataArray
+        Modeled precipitation, possibly dask-backed. [time x ...]
+    params : xr.Dataset
+        Transfer parameters as returned by fit_transfer.
+
+    Returns
+    -------
+    xr.DataArray
+        Corrected precipitation, lazy if mod is dask-backed.
+    """
+    if 'month' in params.dims:
+        params = params.sel(month=mod.time.dt.month).drop_vars('month')
+    names = ['mod_shape', 'mod_scale', 'mod_p0',
+             'obs_shape', 'obs_scale', 'obs_p0']
+    corrected = xr.apply_ufunc(quantile_map, mod, *[params[n] for n in names],
+                               kwargs={'wet': params.attrs.get('wet', 0.0)},
+                               dask='parallelized', output_dtypes=[float])
+    return corrected.transpose(*mod.dims).rename(mod.name)
+
+
+def correct_to_netcdf(mod, params, filepath, chunks=None):
+    """Bias correct a modeled field and stream it to a netCDF file.
+
+    The field is processed in time/run chunks that are computed in
+    parallel by dask and written as they are ready, so only a few chunks
+    are held in memory at once.
+
+    Parameters
+    ----------
+    mod : xr.DataArray
+        Modeled precipitation. [time x run x lat x lon]
+    params : xr.Dataset
+        Transfer parameters as returned by fit_transfer.
+    filepath : str
+        Output netCDF file.
+    chunks : dict, optional
+        Chunk sizes. Default is {'time': 120, 'run': 10}.
+    """
+    if chunks is None:
+        chunks = {'time': 120, 'run': 10}
+    mod = mod.chunk(chunks)
+    corrected = apply_transfer(mod, params).astype('float32')
+    ds = corrected.to_dataset(name='pr')
+    ds['pr'].attrs.update(units='mm/month',
+                          bias_correction='gamma quantile mapping',
+                          calibration=params.attrs.get('calibration', ''))
+    encoding = {'pr': {'zlib': True, 'complevel': 1,
+                       'chunksizes': tuple(ds.chunksizes[d][0]
+                                           for d in ds['pr'].dims)}}
+    ds.to_netcdf(filepath, encoding=encoding)
@@ -0,0 +1,235 @@
+"""Baseline climatology and standardization utilities.
+
+This module provides baseline statistics (count, mean and standard
+deviation) for many baseline windows computed in a single streaming pass
+over an ensemble, caches them by dataset and window, and applies them
+by broadcasting. It contains the following main functions:
+
+    * window_stats: Compute baseline statistics for many windows in one
+        pass over time chunks using Welford/Chan updates.
+
+    * baseline: Access the cached baseline statistics of a dataset for a
+        given window, computing them if needed.
+
+    * anomaly: Compute anomalies with respect to a baseline window.
+
+    * standardize: Compute standardized anomalies with respect to a
+        baseline window.
+
+    * clear_cache: Remove cached baseline statistics.
+"""
+
+import numpy as np
+import xarray as xr
+
+_CACHE = {}
+
+
+def _layout(da, keep):
+    """Return da transposed to [time x reduced x kept] and the kept dims."""
+    keep = [d for d in da.dims if d in keep]
+    reduced = [d for d in da.dims if d != 'time' and d not in keep]
+    return da.transpose('time', *reduced, *keep), keep
+
+
+def _data_key(da):
+    """Identify the data of a cache entry by dims, shape and time range."""
+    time = da.time.values
+    return (da.dims, da.shape, str(time[0]), str(time[-1]))
+
+
+def window_stats(da, windows, keep=(), chunk=50):
+    """Compute baseline statistics for many windows in a single pass.
+
+    The time axis is streamed in chunks and every chunk updates the
+    count, mean and sum of squared deviations of each window that overlaps
+    it, using Chan's parallel form of Welford's algorithm. Only one chunk
+    is loaded at a time, so a dask-backed input is computed chunk by chunk
+    and chunks outside every window are not loaded at all. NaNs are
+    ignored.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Yearly data. [time x ...]
+    windows : list of tuple
+        (ini_year, end_year) baseline windows, both years included.
+    keep : tuple of str, optional
+        Dimensions not reduced, e.g. ('run',) for per-member statistics.
+        By default statistics are pooled over every dimension, as in
+        da.sel(time=slice(ini_year, end_year)).mean().
+    chunk : int, optional
+        Number of time steps per chunk. Default is 50.
+
+    Returns
+    -------
+    xr.Dataset
+        count, mean and m2 (sum of squared deviations). [window x keep]
+    """
+    windows = [(int(ini), int(end)) for ini, end in windows]
+    da, keep = _layout(da, keep)
+    years = da.time.dt.year.values
+    nwin = len(windows)
+    nkeep = int(np.prod([da.sizes[d] for d in keep]))
+    count = np.zeros((nwin, nkeep))
+    mean = np.zeros((nwin, nkeep))
+    m2 = np.zeros((nwin, nkeep))
+
+    for start in range(0, years.size, chunk):
+        block_years = years[start:start + chunk]
+        if not any((block_years <= end).any() and (block_years >= ini).any()
+                   for ini, end in windows):
+            continue
+        block = da.isel(time=slice(start, start + chunk)).values
+        block = block.reshape(block_years.size, -1, nkeep)
+        for w, (ini, end) in enumerate(windows):
+            inside = (block_years >= ini) & (block_years <= end)
+            if not inside.any():
+                continue
+            x = block[inside]
+            n_b = np.sum(~np.isnan(x), axis=(0, 1))
+            valid = n_b > 0
+            mean_b = np.zeros(nkeep)
+            mean_b[valid] = np.nanmean(x[:, :, valid], axis=(0, 1))
+            m2_b = np.nansum((x - mean_b)**2, axis=(0, 1))
+            n_a = count[w]
+            n = n_a + n_b
+            delta = mean_b - mean[w]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean[w] = np.where(n > 0, mean[w] + delta*n_b/n, 0.0)
+                m2[w] = np.where(n > 0, m2[w] + m2_b + delta**2*n_a*n_b/n,
+                                 0.0)
+            count[w] = n
+
+    shape = (nwin,) + tuple(da.sizes[d] for d in keep)
+    dims = ['window'] + keep
+    coords = {'window': [f'{ini}-{end}' for ini, end in windows]}
+    coords.update({d: da[d].values for d in keep if d in da.coords})
+    return xr.Dataset({'count': (dims, count.reshape(shape)),
+                       'mean': (dims, mean.reshape(shape)),
+                       'm2': (dims, m2.reshape(shape))}, coords=coords)
+
+
+def baseline(da, name, ini_year, end_year, keep=(), windows=None):
+    """Access the cached baseline statistics of a dataset.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Yearly data. [time x ...]
+    name : str
+        Dataset name used as cache key, e.g. 'lens2_cchile'. The key also
+        holds the dims, shape and time range of da, so a different dataset
+        under the same name is not served stale statistics. Data whose
+        values change without changing any of these (e.g. after applying
+        a new bias correction in place) are not detected: use a new name
+        or call clear_cache(name) first.
+    ini_year, end_year : int or str
+        Baseline window, both years included.
+    keep : tuple of str, optional
+        Dimensions not reduced. Default is to pool every dimension.
+    windows : list of tuple, optional
+        Additional windows computed in the same pass and cached, so that
+        later calls for them do not touch the data again.
+
+    Returns
+    -------
+    xr.Dataset
+        count, mean and m2 of the window. [keep]
+    """
+    keep = tuple(keep)
+    data_key = _data_key(da)
+    key = (name, data_key, int(ini_year), int(end_year), keep)
+    if key not in _CACHE:
+        todo = [(int(ini_year), int(end_year))]
+        todo += [(int(i), int(e)) for i, e in windows or []
+                 if (name, data_key, int(i), int(e), keep) not in _CACHE]
+        todo = list(dict.fromkeys(todo))
+        stats = window_stats(da, todo, keep=keep)
+        for w, (ini, end) in enumerate(todo):
+            _CACHE[(name, data_key, ini, end, keep)] = stats.isel(window=w)
+    return _CACHE[key]
+
+
+def _broadcastable(da, stats, var):
+    """Return stats[var] as an array that broadcasts against da values."""
+    keep = [d for d in da.dims if d in stats[var].dims]
+    values = stats[var].transpose(*keep).values
+    shape = [da.sizes[d] if d in keep else 1 for d in da.dims]
+    return values.reshape(shape)
+
+
+def anomaly(da, name, ini_year, end_year, keep=(), out=None):
+    """Compute anomalies with respect to a baseline window.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Yearly data. [time x ...]
+    name : str
+        Dataset name used as cache key.
+    ini_year, end_year : int or str
+        Baseline window, both years included.
+    keep : tuple of str, optional
+        Dimensions not reduced in the baseline statistics.
+    out : np.ndarray, optional
+        Array where the result is written, e.g. da.values to work in
+        place. By default a new array is allocated.
+
+    Returns
+    -------
+    xr.DataArray
+        Anomalies with the coordinates of da.
+    """
+    stats = baseline(da, name, ini_year, end_year, keep=keep)
+    out = np.subtract(da.values, _broadcastable(da, stats, 'mean'), out=out)
+    return da.copy(data=out)
+
+
+def standardize(da, name, ini_year, end_year, keep=(), ddof=0, out=None):
+    """Compute standardized anomalies with respect to a baseline window.
+
+    The mean is subtracted and the result is divided by the standard
+    deviation in the same output buffer, so no intermediate arrays are
+    created.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Yearly data. [time x ...]
+    name : str
+        Dataset name used as cache key.
+    ini_year, end_year : int or str
+        Baseline window, both years included.
+    keep : tuple of str, optional
+        Dimensions not reduced in the baseline statistics.
+    ddof : int, optional
+        Delta degrees of freedom of the standard deviation. Default is 0,
+        as in xarray.
+    out : np.ndarray, optional
+        Array where the result is written, e.g. da.values to work in
+        place. By default a new array is allocated.
+
+    Returns
+    -------
+    xr.DataArray
+        Standardized anomalies with the coordinates of da.
+    """
+    stats = baseline(da, name, ini_year, end_year, keep=keep)
+    std = np.sqrt(_broadcastable(da, stats, 'm2')
+                  / (_broadcastable(da, stats, 'count') - ddof))
+    out = np.subtract(da.values, _broadcastable(da, stats, 'mean'), out=out)
+    np.divide(out, std, out=out)
+    return da.copy(data=out)
+
+
+def clear_cache(name=None):
+    """Remove cached baseline statistics.
+
+    Parameters
+    ----------
+    name : str, optional
+        Dataset name. By default the whole cache is cleared.
+    """
+    for key in [k for k in _CACHE if name is None or k[0] == name]:
+        del _CACHE[key]
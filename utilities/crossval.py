@@ -0,0 +1,214 @@
+"""Cross-validation of the bias-correction transfer.
+
+This module provides a leave-period-out evaluation of the quantile mapping
+used to correct LENS precipitation against Quinta Normal observations.
+The calibration window is split in contiguous blocks of years; for every
+block the transfer is refitted on the remaining years and the corrected
+ensemble is scored against the held-out observations. Gamma fits are
+obtained from yearly sufficient statistics computed once and summed over
+the training years of each fold. It contains the following main
+functions:
+
+    * period_folds: Split a calibration window in contiguous test blocks.
+
+    * yearly_gamma_stats: Yearly sufficient statistics of the mixed gamma
+        distribution of the modeled ensemble and the observations.
+
+    * cross_validate: Score one or more correction methods out of sample,
+        running the folds in parallel.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import xarray as xr
+
+from utilities import bias_correction
+
+
+def period_folds(ini_year, end_year, length=10):
+    """Split a calibration window in contiguous test blocks.
+
+    Parameters
+    ----------
+    ini_year, end_year : int
+        Calibration window, both years included.
+    length : int, optional
+        Number of years of each test block. The last block may be shorter.
+        Default is 10.
+
+    Returns
+    -------
+    list of tuple
+        (test_ini, test_end) blocks.
+    """
+    return [(ini, min(ini + length - 1, end_year))
+            for ini in range(ini_year, end_year + 1, length)]
+
+
+def _align_years(mod, obs, ini_year, end_year):
+    """Select the calibration window and label both series by year.
+
+    xr.align with join='exact' raises a ValueError if the years of the
+    model and the observations differ, instead of matching them by
+    position.
+    """
+    period = slice(f'{ini_year}', f'{end_year}')
+    mod = mod.sel(time=period)
+    obs = obs.sel(time=period)
+    mod = mod.assign_coords(time=mod.time.dt.year.values)
+    obs = obs.assign_coords(time=obs.time.dt.year.values)
+    return xr.align(mod, obs, join='exact')
+
+
+def yearly_gamma_stats(mod, obs, ini_year, end_year):
+    """Yearly sufficient statistics of the mixed gamma distribution.
+
+    Parameters
+    ----------
+    mod : xr.DataArray
+        Modeled yearly precipitation. [time x run]
+    obs : xr.DataArray
+        Observed yearly precipitation. [time]
+    ini_year, end_year : int
+        Calibration window, both years included.
+
+    Returns
+    -------
+    tuple of xr.Dataset
+        Modeled and observed statistics (see bias_correction.gamma_stats)
+        per year, with time labelled by year. [time]
+
+    Raises
+    ------
+    ValueError
+        If mod and obs do not cover the same years of the window.
+    """
+    mod, obs = _align_years(mod, obs, ini_year, end_year)
+    mod_stats = bias_correction.gamma_stats(mod, 'run')
+    obs_stats = bias_correction.gamma_stats(obs.expand_dims(run=[0]), 'run')
+    return mod_stats, obs_stats
+
+
+def _gamma_transfer(train, mod_stats, obs_stats, mod_train, obs_train):
+    """Fit the gamma transfer from the summed training-year statistics."""
+    mod_params = bias_correction.gamma_params(mod_stats.where(train).sum())
+    obs_params = bias_correction.gamma_params(obs_stats.where(train).sum())
+
+    def transfer(x):
+        return bias_correction.quantile_map(
+            x, *[float(mod_params[k]) for k in ('shape', 'scale', 'p0')],
+            *[float(obs_params[k]) for k in ('shape', 'scale', 'p0')])
+    return transfer
+
+
+def _empirical_transfer(train, mod_stats, obs_stats, mod_train, obs_train):
+    """Fit an empirical quantile mapping on the training years."""
+    probs = np.linspace(0, 1, 101)
+    mod_q = np.nanquantile(mod_train, probs)
+    obs_q = np.nanquantile(obs_train, probs)
+
+    def transfer(x):
+        return np.interp(x, mod_q, obs_q)
+    return transfer
+
+
+METHODS = {'gamma': _gamma_transfer, 'empirical': _empirical_transfer}
+
+
+def cross_validate(obs, mod, ini_year=1921, end_year=2020, length=10,
+                   methods=('gamma', 'empirical'),
+                   probs=(0.05, 0.1, 0.25, 0.5, 0.75, 0.9), hd_percent=5,
+                   max_workers=None):
+    """Score correction methods with leave-period-out cross-validation.
+
+    For every fold, the HD threshold is the hd_percent quantile of the
+    observed training years, so that the tail frequencies measure how well
+    each correction reproduces the observed tail. Scores on the held-out
+    years are the difference between corrected-model and observed
+    quantiles, the model and observed frequencies below the threshold, and
+    the Brier score of the yearly fraction of members below the threshold
+    as a forecast of the observed dry-year events.
+
+    Parameters
+    ----------
+    obs : xr.DataArray
+        Observed yearly precipitation. [time]
+    mod : xr.DataArray
+        Modeled yearly precipitation. [time x run]
+    ini_year, end_year : int, optional
+        Calibration window. Default is 1921-2020.
+    length : int, optional
+        Years per test block. Default is 10.
+    methods : list of str, optional
+        Correction methods, keys of METHODS.
+    probs : list of float, optional
+        Probabilities of the quantile errors.
+    hd_percent : int, optional
+        HD threshold as percent frequency. Default is 5.
+    max_workers : int, optional
+        Number of threads running the folds.
+
+    Returns
+    -------
+    xr.Dataset
+        Per fold: quantile_error [method x fold x prob], freq_mod, freq_obs
+        and brier [method x fold]. Over all folds: mae [method x prob] and
+        brier_skill [method], the Brier skill score against the
+        climatological forecast, the observed frequency below the
+        threshold over the training years of each fold.
+
+    Raises
+    ------
+    ValueError
+        If mod and obs do not cover the same years of the window.
+    """
+    folds = period_folds(ini_year, end_year, length)
+    mod = mod.transpose('time', 'run')
+    mod_stats, obs_stats = yearly_gamma_stats(mod, obs, ini_year, end_year)
+    mod, obs = _align_years(mod, obs, ini_year, end_year)
+    years = mod.time
+    mod_values, obs_values = mod.values, obs.values
+    probs = np.asarray(probs)
+    p_hd = (hd_percent - 1)/(100 - 1)
+
+    def run_fold(method, fold):
+        test_ini, test_end = fold
+        test = (years >= test_ini) & (years <= test_end)
+        train = ~test
+        transfer = METHODS[method](train, mod_stats, obs_stats,
+                                   mod_values[train.values],
+                                   obs_values[train.values])
+        corrected_test = transfer(mod_values[test.values])
+        obs_train = obs_values[train.values]
+        obs_test = obs_values[test.values]
+        threshold = np.nanquantile(obs_train, p_hd)
+        climatology = np.mean(obs_train < threshold)
+        q_error = (np.nanquantile(corrected_test, probs)
+                   - np.nanquantile(obs_test, probs))
+        p_mod = np.mean(corrected_test < threshold, axis=1)
+        event = (obs_test < threshold).astype(float)
+        brier = np.mean((p_mod - event)**2)
+        brier_ref = np.mean((climatology - event)**2)
+        return q_error, 100*p_mod.mean(), 100*event.mean(), brier, brier_ref
+
+    tasks = [(m, f) for m in methods for f in folds]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda t: run_fold(*t), tasks))
+
+    shape = (len(methods), len(folds))
+    q_error = np.array([r[0] for r in results]).reshape(shape + (probs.size,))
+    freq_mod, freq_obs, brier, brier_ref = [
+        np.array([r[i] for r in results]).reshape(shape) for i in range(1, 5)]
+
+    coords = {'method': list(methods),
+              'fold': [f'{ini}-{end}' for ini, end in folds],
+              'prob': probs}
+    return xr.Dataset({
+        'quantile_error': (['method', 'fold', 'prob'], q_error),
+        'freq_mod': (['method', 'fold'], freq_mod),
+        'freq_obs': (['method', 'fold'], freq_obs),
+        'brier': (['method', 'fold'], brier),
+        'mae': (['method', 'prob'], np.abs(q_error).mean(axis=1)),
+        'brier_skill': (['method'],
+                        1 - brier.mean(axis=1)/brier_ref.mean(axis=1)),
+    }, coords=coords)
@@ -0,0 +1,165 @@
+"""Compact year-indexed ensemble container.
+
+This module provides the Ensemble class, a lightweight container for
+yearly [time x run] data used in analysis hot paths. Periods are selected
+by integer offsets from the first year and members by position, returning
+numpy views instead of new xarray objects. It contains the following main
+class:
+
+    * Ensemble: Contiguous [time x run] array with a first year and run
+        labels, convertible to and from the xr.DataArray objects returned
+        by the lens, rpi, stations and observations modules.
+"""
+
+import numpy as np
+import xarray as xr
+
+
+class Ensemble:
+    """Yearly ensemble stored as a contiguous [time x run] array.
+
+    Single time series (e.g. observations) are stored as one-column
+    ensembles and converted back to one-dimensional DataArrays. Only a
+    one-dimensional input is treated as a single time series; a [time x
+    run] input without run labels is converted back with runs labelled
+    0, 1, ...
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Yearly data. [time x run] or [time]
+    year0 : int
+        Year of the first time step.
+    runs : array_like, optional
+        Run labels. Default is no labels.
+    time : np.ndarray, optional
+        Original time coordinate, kept for lossless conversion.
+    name : str, optional
+        Variable name.
+    attrs : dict, optional
+        Variable attributes.
+    coords : dict, optional
+        Non-index coordinates as {name: (dims, values)}.
+    """
+
+    __slots__ = ('values', 'year0', 'runs', 'time', 'name', 'attrs',
+                 'coords', '_is_series')
+
+    def __init__(self, values, year0, runs=None, time=None, name=None,
+                 attrs=None, coords=None):
+        values = np.asarray(values)
+        # remember single time series so they convert back to [time]
+        self._is_series = values.ndim == 1 and runs is None
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        self.values = np.ascontiguousarray(values)
+        self.year0 = int(year0)
+        self.runs = None if runs is None else np.asarray(runs)
+        self.time = time
+        self.name = name
+        self.attrs = {} if attrs is None else dict(attrs)
+        self.coords = {} if coords is None else dict(coords)
+
+    @classmethod
+    def from_dataarray(cls, da):
+        """Create an Ensemble from a yearly DataArray.
+
+        Parameters
+        ----------
+        da : xr.DataArray
+            Yearly data with consecutive years. [time x run] or [time]
+
+        Returns
+        -------
+        Ensemble
+        """
+        extra = [d for d in da.dims if d not in ('time', 'run')]
+        if extra:
+            raise ValueError(f'unsupported dimensions: {extra}')
+        years = da.time.dt.year.values
+        if np.any(np.diff(years) != 1):
+            raise ValueError('time must hold consecutive years')
+        has_run = 'run' in da.dims
+        if has_run:
+            da = da.transpose('time', 'run')
+        coords = {k: (v.dims, v.values) for k, v in da.coords.items()
+                  if k not in da.dims}
+        return cls(da.values, years[0],
+                   runs=da.run.values if has_run else None,
+                   time=da.time.values, name=da.name, attrs=da.attrs,
+                   coords=coords)
+
+    def to_dataarray(self):
+        """Convert the Ensemble to a DataArray.
+
+        Returns
+        -------
+        xr.DataArray
+            Yearly data. [time x run] or [time]
+        """
+        time = self.time
+        if time is None:
+            time = np.array([f'{y}-01-01' for y in self.years],
+                            dtype='datetime64[ns]')
+        if self._is_series:
+            data, dims = self.values[:, 0], ['time']
+            coords = {'time': time}
+        else:
+            runs = np.arange(self.nrun) if self.runs is None else self.runs
+            data, dims = self.values, ['time', 'run']
+            coords = {'time': time, 'run': runs}
+        coords.update(self.coords)
+        return xr.DataArray(data, coords=coords, dims=dims, name=self.name,
+                            attrs=self.attrs)
+
+    @property
+    def nyear(self):
+        """Number of years."""
+        return self.values.shape[0]
+
+    @property
+    def nrun(self):
+        """Number of runs."""
+        return self.values.shape[1]
+
+    @property
+    def years(self):
+        """Years of the time steps."""
+        return np.arange(self.year0, self.year0 + self.nyear)
+
+    def index(self, year):
+        """Return the time index of a year."""
+        return int(year) - self.year0
+
+    def period(self, ini_year, end_year):
+        """Return a view of the data from ini_year to end_year.
+
+        Years outside the record are clipped, as in a label slice.
+
+        Returns
+        -------
+        np.ndarray
+            View of the data. [time x run]
+        """
+        ini = max(self.index(ini_year), 0)
+        end = max(self.index(end_year) + 1, 0)
+        return self.values[ini:end]
+
+    def member(self, run):
+        """Return a view of the time series of the run at position run."""
+        return self.values[:, run]
+
+    def sel_period(self, ini_year, end_year):
+        """Return an Ensemble viewing the data from ini_year to end_year."""
+        ini = max(self.index(ini_year), 0)
+        end = max(self.index(end_year) + 1, 0)
+        time = None if self.time is None else self.time[ini:end]
+        ens = Ensemble(self.values[ini:end], self.year0 + ini,
+                       runs=self.runs, time=time, name=self.name,
+                       attrs=self.attrs, coords=self.coords)
+        ens._is_series = self._is_series
+        return ens
+
+    def __repr__(self):
+        return (f'<Ensemble {self.name or ""} [{self.nyear} x {self.nrun}] '
+                f'{self.year0}-{self.year0 + self.nyear - 1}>')
@@ -0,0 +1,294 @@
+"""Frequency and intensity statistics of dry years.
+
+This module provides the quantile (p -> v) and bootstrap non-exceedance
+probability (v -> p) estimators used in the frequency-change analyses.
+Data are given as Ensemble objects so that periods are selected by integer
+offsets and all runs are processed at once. It contains the following main
+functions:
+
+    * invcdf_from_obs: Quantile of an observed time series over a period.
+
+    * invcdf_from_mod_ens: Quantile of each run of an ensemble over a
+        period.
+
+    * cdf_from_obs: Bootstrap non-exceedance probability of a value in an
+        observed time series over a period.
+
+    * cdf_from_mod_ens: Bootstrap non-exceedance probability of a value in
+        each run of an ensemble over a period.
+
+    * cdf_from_obs_adaptive, cdf_from_mod_ens_adaptive: Bootstrap
+        estimates that draw resamples in batches until the Monte Carlo
+        standard error falls below a tolerance.
+"""
+
+import numpy as np
+
+
+def percentile_rank(pool, v):
+    """Percentile rank of v in pool along the last axis, as a fraction.
+
+    Equivalent to scipy.stats.percentileofscore(pool, v, kind='rank')/100,
+    vectorized over the leading axes of pool.
+    """
+    left = np.count_nonzero(pool < v, axis=-1)
+    right = np.count_nonzero(pool <= v, axis=-1)
+    return (left + right + (right > left))*0.5/pool.shape[-1]
+
+
+def _bootstrap_cdf(y, v, nboot, nsample, rng):
+    """Mean bootstrap percentile rank of v for every column of y."""
+    idx = rng.integers(0, y.shape[0], size=(y.shape[1], nboot, nsample))
+    pools = y[idx, np.arange(y.shape[1])[:, np.newaxis, np.newaxis]]
+    return percentile_rank(pools, v).mean(axis=-1)
+
+
+def _adaptive_bootstrap_cdf(y, v, tol, batch, nsample, max_boot, rng):
+    """Bootstrap percentile rank of v per column of y with early stopping.
+
+    Resamples are drawn in batches for the columns that have not converged
+    yet; a column stops once the standard error of its mean rank is below
+    tol or max_boot resamples were drawn. Returns the mean rank, number of
+    resamples and standard error of every column.
+    """
+    nrun = y.shape[1]
+    total = np.zeros(nrun)
+    total2 = np.zeros(nrun)
+    count = np.zeros(nrun, dtype=int)
+    stderr = np.full(nrun, np.inf)
+    active = np.arange(nrun)
+    while active.size:
+        idx = rng.integers(0, y.shape[0], size=(active.size, batch, nsample))
+        ranks = percentile_rank(y[idx, active[:, np.newaxis, np.newaxis]], v)
+        total[active] += ranks.sum(axis=-1)
+        total2[active] += (ranks**2).sum(axis=-1)
+        count[active] += batch
+        n = count[active]
+        mean = total[active]/n
+        var = np.maximum(total2[active] - n*mean**2, 0)/np.maximum(n - 1, 1)
+        stderr[active] = np.sqrt(var/n)
+        done = (stderr[active] < tol) | (n >= max_boot)
+        active = active[~done]
+    return total/count, count, stderr
+
+
+def _bootstrap_block(block, ini, end, v, nboot, nsample, seed):
+    """Bootstrap CDF of the runs of a shared-memory block (worker task)."""
+    rng = np.random.default_rng(seed)
+    return _bootstrap_cdf(block[ini:end], v, nboot, nsample, rng)
+
+
+# p -> v
+def invcdf_from_obs(obs_data, p, ini_year, end_year):
+    """Quantile of an observed time series over a period.
+
+    Parameters
+    ----------
+    obs_data : Ensemble
+        Observed yearly data (single run).
+    p : float or array_like
+        Non-exceedance probabilities.
+    ini_year, end_year : int
+        Period, both years included.
+
+    Returns
+    -------
+    float or np.ndarray
+        Quantiles. [p]
+    """
+    y = obs_data.period(ini_year, end_year)[:, 0]
+    return np.quantile(y, p)
+
+
+# p -> v
+def invcdf_from_mod_ens(mod_data, p, ini_year, end_year):
+    """Quantile of each run of an ensemble over a period.
+
+    Parameters
+    ----------
+    mod_data : Ensemble
+        Modeled yearly data. [time x run]
+    p : float or array_like
+        Non-exceedance probabilities.
+    ini_year, end_year : int
+        Period, both years included.
+
+    Returns
+    -------
+    np.ndarray
+        Quantiles. [run] or [p x run]
+    """
+    return np.quantile(mod_data.period(ini_year, end_year), p, axis=0)
+
+
+# v -> p
+def cdf_from_mod_ens(mod_data, v, ini_year, end_year, nboot=100,
+                     nsample=100, rng=None, pool=None):
+    """Bootstrap non-exceedance probability of a value in each run.
+
+    For every run, nboot samples of size nsample are drawn with replacement
+    from the period and the percentile rank of v is averaged over samples.
+    With a pool, runs are split into blocks evaluated by its worker
+    processes, each block with its own random stream. The pool is created
+    once by the caller and reused across periods and thresholds.
+
+    Parameters
+    ----------
+    mod_data : Ensemble
+        Modeled yearly data. [time x run]
+    v : float
+        Threshold value.
+    ini_year, end_year : int
+        Period, both years included.
+    nboot : int, optional
+        Number of bootstrap samples. Default is 100.
+    nsample : int, optional
+        Size of each bootstrap sample. Default is 100.
+    rng : np.random.Generator, optional
+        Random number generator.
+    pool : parallel.SharedEnsemblePool, optional
+        Pool holding mod_data.values split along runs. By default runs are
+        evaluated in the calling process.
+
+    Returns
+    -------
+    np.ndarray
+        Non-exceedance probabilities. [run]
+
+    Raises
+    ------
+    ValueError
+        If the pool does not hold an array shaped like mod_data.values
+        split along runs.
+    """
+    rng = np.random.default_rng(rng)
+    if pool is None:
+        y = mod_data.period(ini_year, end_year)
+        return _bootstrap_cdf(y, v, nboot, nsample, rng)
+    if pool.shape != mod_data.values.shape or pool.axis != 1:
+        raise ValueError(f'pool holds an array of shape {pool.shape} split '
+                         f'along axis {pool.axis}, expected '
+                         f'{mod_data.values.shape} split along axis 1')
+    ini = max(mod_data.index(ini_year), 0)
+    end = max(mod_data.index(end_year) + 1, 0)
+    seeds = np.random.SeedSequence(rng.integers(2**63)).spawn(
+        len(pool.blocks()))
+    results = pool.starmap(_bootstrap_block,
+                           [(ini, end, v, nboot, nsample, seed)
+                            for seed in seeds])
+    return np.concatenate(results)
+
+
+# v -> p
+def cdf_from_obs(obs_data, v, ini_year, end_year, nboot=100, nsample=100,
+                 rng=None):
+    """Bootstrap non-exceedance probability of a value in observations.
+
+    Parameters
+    ----------
+    obs_data : Ensemble
+        Observed yearly data (single run).
+    v : float
+        Threshold value.
+    ini_year, end_year : int
+        Period, both years included.
+    nboot : int, optional
+        Number of bootstrap samples. Default is 100.
+    nsample : int, optional
+        Size of each bootstrap sample. Default is 100.
+    rng : np.random.Generator, optional
+        Random number generator.
+
+    Returns
+    -------
+    float
+        Non-exceedance probability.
+    """
+    rng = np.random.default_rng(rng)
+    y = obs_data.period(ini_year, end_year)[:, :1]
+    return float(_bootstrap_cdf(y, v, nboot, nsample, rng)[0])
+
+
+# v -> p
+def cdf_from_mod_ens_adaptive(mod_data, v, ini_year, end_year, tol=0.002,
+                              batch=20, nsample=100, max_boot=2000,
+                              rng=None):
+    """Adaptive bootstrap non-exceedance probability of a value in each run.
+
+    Same estimator as cdf_from_mod_ens, but resamples are drawn in batches
+    and each run stops as soon as the Monte Carlo standard error of its
+    estimate is below tol, so stable runs use few resamples and runs near
+    the tails use as many as needed.
+
+    Parameters
+    ----------
+    mod_data : Ensemble
+        Modeled yearly data. [time x run]
+    v : float
+        Threshold value.
+    ini_year, end_year : int
+        Period, both years included.
+    tol : float, optional
+        Target standard error of the probability (fraction, not percent).
+        Default is 0.002.
+    batch : int, optional
+        Resamples drawn per run and iteration. Default is 20.
+    nsample : int, optional
+        Size of each bootstrap sample. Default is 100.
+    max_boot : int, optional
+        Maximum number of resamples per run. Default is 2000.
+    rng : np.random.Generator, optional
+        Random number generator.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Non-exceedance probabilities [run], number of resamples used by
+        each run [run] and achieved Monte Carlo standard error of each
+        probability [run]. Runs stopped at max_boot before converging have
+        a standard error of tol or more.
+    """
+    rng = np.random.default_rng(rng)
+    y = mod_data.period(ini_year, end_year)
+    return _adaptive_bootstrap_cdf(y, v, tol, batch, nsample, max_boot, rng)
+
+
+# v -> p
+def cdf_from_obs_adaptive(obs_data, v, ini_year, end_year, tol=0.002,
+                          batch=20, nsample=100, max_boot=2000, rng=None):
+    """Adaptive bootstrap non-exceedance probability of a value in
+    observations.
+
+    Parameters
+    ----------
+    obs_data : Ensemble
+        Observed yearly data (single run).
+    v : float
+        Threshold value.
+    ini_year, end_year : int
+        Period, both years included.
+    tol : float, optional
+        Target standard error of the probability (fraction, not percent).
+        Default is 0.002.
+    batch : int, optional
+        Resamples drawn per iteration. Default is 20.
+    nsample : int, optional
+        Size of each bootstrap sample. Default is 100.
+    max_boot : int, optional
+        Maximum number of resamples. Default is 2000.
+    rng : np.random.Generator, optional
+        Random number generator.
+
+    Returns
+    -------
+    tuple
+        Non-exceedance probability (float), number of resamples used (int)
+        and achieved Monte Carlo standard error of the probability
+        (float). If the estimate stopped at max_boot before converging,
+        the standard error is tol or more.
+    """
+    rng = np.random.default_rng(rng)
+    y = obs_data.period(ini_year, end_year)[:, :1]
+    probs, count, stderr = _adaptive_bootstrap_cdf(y, v, tol, batch,
+                                                   nsample, max_boot, rng)
+    return float(probs[0]), int(count[0]), float(stderr[0])
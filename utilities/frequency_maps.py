@@ -0,0 +1,138 @@
+"""Gridded drought frequency and intensity change maps.
+
+This module extends the single-point frequency-change analysis to every
+gridpoint of a [time x run x lat x lon] ensemble. The HD (hydrological
+drought) threshold, the HD frequencies and the deficit intensities are
+computed for all gridpoints, runs and periods with array reductions along
+the time axis. It contains the following main functions:
+
+    * hd_threshold: HD threshold at every gridpoint as the ensemble-mean
+        5th percentile over the reference period.
+
+    * hd_frequency_maps: HD frequency and intensity per period, run and
+        gridpoint.
+
+    * ensemble_summary: Ensemble mean and interquartile range of the maps.
+"""
+
+import numpy as np
+import xarray as xr
+
+from utilities import frequency
+
+# p used for the 5% HD threshold in the frequency-change scripts
+HD_PROB = (5-1)/(100-1)
+
+
+def _period_values(da, ini_year, end_year):
+    """Return the [time x run x lat x lon] values of a period."""
+    return da.sel(time=slice(f'{ini_year}', f'{end_year}')).values
+
+
+def hd_threshold(da, ini_year=1971, end_year=2020, p=HD_PROB):
+    """Compute the HD threshold at every gridpoint.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Yearly precipitation. [time x run x lat x lon]
+    ini_year, end_year : int, optional
+        Reference period. Default is 1971-2020.
+    p : float, optional
+        Non-exceedance probability. Default is the 5% HD probability.
+
+    Returns
+    -------
+    xr.DataArray
+        Ensemble mean of the per-run p-quantile. [lat x lon]
+    """
+    da = da.transpose('time', 'run', 'lat', 'lon')
+    values = np.quantile(_period_values(da, ini_year, end_year), p, axis=0)
+    return xr.DataArray(values.mean(axis=0),
+                        coords={'lat': da.lat, 'lon': da.lon},
+                        dims=['lat', 'lon'], name='hd_threshold')
+
+
+def hd_frequency_maps(da, periods, ref_ini=1971, ref_end=2020, p=HD_PROB,
+                      reference=None):
+    """Compute HD frequency and intensity maps.
+
+    The HD frequency is the percentile rank (kind='rank') of the HD
+    threshold within each period, i.e. the expected value of the bootstrap
+    estimate used in the frequency-change scripts. The HD intensity is the
+    precipitation deficit of the per-run p-quantile of each period with
+    respect to the reference mean.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Yearly precipitation. [time x run x lat x lon]
+    periods : list of tuple
+        (ini_year, end_year) pairs, e.g. [(1921, 1970), (1971, 2020),
+        (2021, 2070)].
+    ref_ini, ref_end : int, optional
+        Reference period of the threshold and mean. Default is 1971-2020.
+    p : float, optional
+        Non-exceedance probability. Default is the 5% HD probability.
+    reference : xr.DataArray, optional
+        Reference mean precipitation. [lat x lon] Default is the ensemble
+        mean over the reference period.
+
+    Returns
+    -------
+    xr.Dataset
+        hd_frequency (%) and hd_intensity (deficit in %), both
+        [period x run x lat x lon], and hd_threshold [lat x lon].
+    """
+    da = da.transpose('time', 'run', 'lat', 'lon')
+    threshold = hd_threshold(da, ref_ini, ref_end, p)
+    if reference is None:
+        reference = da.sel(time=slice(f'{ref_ini}', f'{ref_end}')).mean(
+            ['time', 'run'])
+    ref = reference.transpose('lat', 'lon').values
+    th = threshold.values
+
+    shape = (len(periods),) + da.shape[1:]
+    freq = np.empty(shape)
+    intensity = np.empty(shape)
+    for k, (ini, end) in enumerate(periods):
+        y = _period_values(da, ini, end)
+        # time as the last axis, threshold broadcast over runs and time
+        freq[k] = 100*frequency.percentile_rank(np.moveaxis(y, 0, -1),
+                                                th[..., np.newaxis])
+        intensity[k] = 100*(1 - np.quantile(y, p, axis=0)/ref)
+
+    dims = ['period', 'run', 'lat', 'lon']
+    coords = {'period': [f'{ini}-{end}' for ini, end in periods],
+              'run': da.run, 'lat': da.lat, 'lon': da.lon}
+    ds = xr.Dataset({'hd_frequency': (dims, freq),
+                     'hd_intensity': (dims, intensity),
+                     'hd_threshold': threshold}, coords=coords)
+    ds['hd_frequency'].attrs['units'] = '%'
+    ds['hd_intensity'].attrs['units'] = f'% deficit wrt. {ref_ini}-{ref_end}'
+    return ds
+
+
+def ensemble_summary(ds):
+    """Compute the ensemble mean and interquartile range of the maps.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Maps as returned by hd_frequency_maps.
+
+    Returns
+    -------
+    xr.Dataset
+        Variables with a 'stat' dimension (mean, p25, p75) instead of run.
+        Variables without a run dimension (hd_threshold) are kept
+        unchanged.
+    """
+    maps = ds[[v for v in ds.data_vars if 'run' in ds[v].dims]]
+    fixed = ds[[v for v in ds.data_vars if 'run' not in ds[v].dims]]
+    stats = [maps.mean('run', keep_attrs=True),
+             maps.quantile(0.25, 'run', keep_attrs=True).drop_vars('quantile'),
+             maps.quantile(0.75, 'run', keep_attrs=True).drop_vars('quantile')]
+    summary = xr.concat(stats, dim=xr.DataArray(['mean', 'p25', 'p75'],
+                                                dims='stat', name='stat'))
+    return xr.merge([summary, fixed])
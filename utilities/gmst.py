@@ -25,7 +25,6 @@ different sources. It contains the following main functions:
 from os.path import join
 import pandas as pd
 import xarray as xr
-import statsmodels.api as sm
 
 
 def annual_global_gistemp():
@@ -71,6 +70,7 @@ def annual_global_gistemp_lowess_from_statsmodel():
     xr.DataArray
         Annual GMST data from 1880 to 2022 with a 5-year lowess smoothing.
     """
+    import statsmodels.api as sm  # deferred, slow to import
     gmst = annual_global_gistemp()
     n = gmst.size
     smooth_gmst = sm.nonparametric.lowess(
@@ -113,6 +113,7 @@ def annual_global_hadcrut_lowess_from_statsmodel():
     xr.DataArray
         Annual GMST data from 1850 to 2022 with a 5-year lowess smoothing.
     """
+    import statsmodels.api as sm  # deferred, slow to import
     gmst = annual_global_hadcrut()['anom']
     n = gmst.size
     smooth_gmst = sm.nonparametric.lowess(
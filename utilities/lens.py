@@ -15,6 +15,12 @@ contains the following main functions:
         to 2100 covering the Chilean territory from 30 to 37ºS and take the    
         spatial average.
         
+    * lens1_chile_grid: Access the LENS1 monthly precipitation field from
+        1920 to 2100 over the Chilean domain without spatial averaging.
+
+    * lens2_chile_grid: Access the LENS2 monthly precipitation field from
+        1850 to 2100 over the Chilean domain without spatial averaging.
+
     * lens1_annual_gmst_ensmean: Access the LENS1 40-member ensemble-mean 
         annual GMST data from 1920 to 2100.
     
@@ -92,6 +98,56 @@ def lens2_cchile_gridpoints():
     return da_mm_year
 
 
+def lens1_chile_grid(chunks=None):
+    """Access the LENS1 monthly precipitation field from 1920 to 2100 over
+    the Chilean domain at 1º resolution.
+
+    Parameters
+    ----------
+    chunks : dict, optional
+        Dask chunk sizes passed to xr.open_dataset, e.g. {'time': 120,
+        'run': 10}. If None, data is loaded eagerly.
+
+    Returns
+    -------
+    xr.DataArray
+        LENS1 monthly precipitation from 1920 to 2100 in mm/month.
+        [time x run x lat x lon]
+    """
+    basedir = '/home/tcarrasco/result/data/LENS1/pr/final/'
+    filename = 'CESM1_LENS_pr_mon_1920_2100_chile_1deg_40m.nc'
+    filepath = basedir + filename
+    ds = xr.open_dataset(filepath, chunks=chunks)
+    da = ds['pr']*1e-3*3600*24*1000  # monthly mean precip flux in mm/day
+    da_mm_month = da*da.time.dt.days_in_month  # mm/month
+    return da_mm_month.transpose('time', 'run', 'lat', 'lon')
+
+
+def lens2_chile_grid(chunks=None):
+    """Access the LENS2 monthly precipitation field from 1850 to 2100 over
+    the Chilean domain at 1º resolution.
+
+    Parameters
+    ----------
+    chunks : dict, optional
+        Dask chunk sizes passed to xr.open_dataset, e.g. {'time': 120,
+        'run': 10}. If None, data is loaded eagerly.
+
+    Returns
+    -------
+    xr.DataArray
+        LENS2 monthly precipitation from 1850 to 2100 in mm/month.
+        [time x run x lat x lon]
+    """
+    basedir = '/home/tcarrasco/result/data/LENS2/pr/final/'
+    filename = 'CESM2_LENS_pr_mon_1850_2100_chile_1deg_100m_NOAA.nc'
+    filepath = basedir + filename
+    ds = xr.open_dataset(filepath, chunks=chunks)
+    da = ds['pr']*1e-3*3600*24*1000  # monthly mean precip flux in mm/day
+    da_mm_month = da*da.time.dt.days_in_month  # mm/month
+    return da_mm_month.transpose('time', 'run', 'lat', 'lon')
+
+
 def lens1_annual_gmst_ensmean():
     """Access the LENS1 40-member ensemble-mean annual GMST data from 1920
     to 2100.
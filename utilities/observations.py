@@ -0,0 +1,93 @@
+"""Observational dataset access functions.
+
+This module provides a single, time-aligned annual dataset with every
+observational series used in the analyses, built once from the raw text
+sources and persisted as a netCDF file. It contains the following main
+functions:
+
+    * build_observational_cube: Build the annual observational dataset from
+        the raw QN, RPI and GMST sources and save it to disk.
+
+    * observational_cube: Access the annual observational dataset from 1850
+        to 2022, building it first if needed.
+"""
+
+import os
+import pandas as pd
+import xarray as xr
+
+from utilities import gmst, rpi, stations
+
+FILEPATH = '/home/tcarrasco/result/data/observations/obs_annual_1850_2022.nc'
+
+
+def _align(da, time):
+    """Relabel yearly data by year start and align it with a time index."""
+    years = da.time.dt.year.values
+    da = da.assign_coords(time=pd.to_datetime([f'{y}' for y in years]))
+    return da.reindex(time=time).astype(float)
+
+
+def build_observational_cube(filepath=FILEPATH):
+    """Build the annual observational dataset from the raw sources.
+
+    Parameters
+    ----------
+    filepath : str, optional
+        Output netCDF file. If None, the dataset is not saved.
+
+    Returns
+    -------
+    xr.Dataset
+        Annual observational dataset from 1850 to 2022 with variables
+        qn (Quinta Normal station record, mm/year), qn_rpi, rpi1 and rpi2
+        (RPI time series), gistemp and gistemp_lowess (GISTEMP GMST and
+        GISS 5-year lowess), hadcrut, hadcrut_lower, hadcrut_upper (HadCRUT
+        GMST anomaly wrt. 1850-1900 and its 95% confidence limits) and
+        hadcrut_lowess (statsmodels lowess of the HadCRUT anomaly).
+    """
+    time = pd.date_range(start='1850-01-01', end='2022-12-31', freq='1YS')
+    ds_rpi = rpi.rpi_timeseries()
+    ds_hadcrut = gmst.annual_global_hadcrut()
+    sources = {
+        'qn': stations.yearly_precip_QN_1866_2022(),
+        'qn_rpi': ds_rpi['qn'],
+        'rpi1': ds_rpi['rpi1'],
+        'rpi2': ds_rpi['rpi2'],
+        'gistemp': gmst.annual_global_gistemp(),
+        'gistemp_lowess': gmst.annual_global_gistemp_lowess_from_csv(),
+        'hadcrut': ds_hadcrut['anom'],
+        'hadcrut_lower': ds_hadcrut['lower'],
+        'hadcrut_upper': ds_hadcrut['upper'],
+        'hadcrut_lowess': gmst.annual_global_hadcrut_lowess_from_statsmodel(),
+    }
+    ds = xr.Dataset({name: _align(da, time) for name, da in sources.items()})
+    for name in ['qn', 'qn_rpi', 'rpi1', 'rpi2']:
+        ds[name].attrs['units'] = 'mm/year'
+    for name in ['gistemp', 'gistemp_lowess', 'hadcrut', 'hadcrut_lower',
+                 'hadcrut_upper', 'hadcrut_lowess']:
+        ds[name].attrs['units'] = 'degC'
+    if filepath is not None:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        ds.to_netcdf(filepath)
+    return ds
+
+
+def observational_cube(refresh=False):
+    """Access the annual observational dataset from 1850 to 2022.
+
+    Parameters
+    ----------
+    refresh : bool, optional
+        If True, rebuild the dataset from the raw sources.
+
+    Returns
+    -------
+    xr.Dataset
+        Annual observational dataset from 1850 to 2022. See
+        build_observational_cube for the variables.
+    """
+    if refresh or not os.path.exists(FILEPATH):
+        return build_observational_cube(FILEPATH)
+    with xr.open_dataset(FILEPATH) as ds:
+        return ds.load()
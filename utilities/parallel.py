@@ -0,0 +1,180 @@
+"""Shared-memory process pool for ensemble statistics.
+
+This module provides a process pool whose workers read the ensemble from
+a multiprocessing.shared_memory block instead of receiving a pickled copy
+of it with every task. The array is copied into shared memory once and
+every task gets a zero-copy view of its members. It contains the following
+main class and function:
+
+    * SharedEnsemblePool: Context manager that places an array in shared
+        memory and runs per-member or per-chunk tasks on it.
+
+    * map_members: Run a function over blocks of members of an array in a
+        temporary SharedEnsemblePool.
+"""
+
+import os
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+# worker-side state: the attached shared memory block and its array view
+_WORKER = {}
+
+
+def _attach(name, shape, dtype):
+    """Attach to a shared memory block and view it as an array."""
+    shm = shared_memory.SharedMemory(name=name)
+    _WORKER['shm'] = shm
+    _WORKER['values'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _run_task(func, axis, start, stop, args, kwargs):
+    """Call func on a view of members start:stop of the shared array."""
+    values = _WORKER['values']
+    index = (slice(None),)*axis + (slice(start, stop),)
+    return func(values[index], *args, **kwargs)
+
+
+def _default_context():
+    """Fork where available so scripts are not re-imported by workers."""
+    methods = mp.get_all_start_methods()
+    return mp.get_context('fork' if 'fork' in methods else 'spawn')
+
+
+class SharedEnsemblePool:
+    """Process pool with an ensemble array in shared memory.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Ensemble data, e.g. [time x run] or [time x run x lat x lon].
+    axis : int, optional
+        Member axis along which tasks are split. Default is 1 (run).
+    processes : int, optional
+        Number of worker processes. Default is os.cpu_count().
+    context : multiprocessing context, optional
+        Default is 'fork' where available, else 'spawn'.
+
+    Examples
+    --------
+    >>> with SharedEnsemblePool(ens.values) as pool:
+    ...     q05 = np.concatenate(pool.map(np.quantile, 0.05, axis=0))
+    """
+
+    def __init__(self, values, axis=1, processes=None, context=None):
+        values = np.asarray(values)
+        self.axis = axis
+        self.shape = values.shape
+        self.dtype = values.dtype
+        self.processes = processes or os.cpu_count() or 1
+        self._shm = shared_memory.SharedMemory(create=True,
+                                               size=max(values.nbytes, 1))
+        shared = np.ndarray(values.shape, dtype=values.dtype,
+                            buffer=self._shm.buf)
+        shared[...] = values
+        context = context or _default_context()
+        self._pool = context.Pool(
+            self.processes, initializer=_attach,
+            initargs=(self._shm.name, self.shape, self.dtype.str))
+
+    def blocks(self, chunk=None):
+        """Return (start, stop) member blocks.
+
+        Parameters
+        ----------
+        chunk : int, optional
+            Members per block. Default splits the members evenly across
+            the worker processes.
+        """
+        nmember = self.shape[self.axis]
+        if chunk is None:
+            chunk = -(-nmember // self.processes)
+        return [(start, min(start + chunk, nmember))
+                for start in range(0, nmember, max(chunk, 1))]
+
+    def map(self, func, *args, chunk=None, **kwargs):
+        """Run func on every block of members.
+
+        Parameters
+        ----------
+        func : callable
+            Module-level function called as func(block, *args, **kwargs),
+            where block is a read-only-by-convention view of the shared
+            array restricted to the members of the block.
+        chunk : int, optional
+            Members per task. Use 1 for per-member tasks. Default splits
+            the members evenly across the worker processes.
+
+        Returns
+        -------
+        list
+            Results of every block, in member order.
+        """
+        tasks = [(func, self.axis, start, stop, args, kwargs)
+                 for start, stop in self.blocks(chunk)]
+        return self._pool.starmap(_run_task, tasks)
+
+    def starmap(self, func, block_args, chunk=None, **kwargs):
+        """Run func on every block of members with block-specific arguments.
+
+        Parameters
+        ----------
+        func : callable
+            Module-level function called as func(block, *args, **kwargs).
+        block_args : list of tuple
+            Positional arguments of each block, aligned with
+            self.blocks(chunk), e.g. one random seed per block.
+        chunk : int, optional
+            Members per task. Default splits the members evenly across
+            the worker processes.
+
+        Returns
+        -------
+        list
+            Results of every block, in member order.
+        """
+        tasks = [(func, self.axis, start, stop, tuple(args), kwargs)
+                 for (start, stop), args in zip(self.blocks(chunk),
+                                                block_args, strict=True)]
+        return self._pool.starmap(_run_task, tasks)
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        self._pool.close()
+        self._pool.join()
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def map_members(func, values, *args, axis=1, processes=None, chunk=None,
+                **kwargs):
+    """Run a function over blocks of members in a shared-memory pool.
+
+    Parameters
+    ----------
+    func : callable
+        Module-level function called as func(block, *args, **kwargs).
+    values : np.ndarray
+        Ensemble data.
+    axis : int, optional
+        Member axis. Default is 1 (run).
+    processes : int, optional
+        Number of worker processes. Default is os.cpu_count().
+    chunk : int, optional
+        Members per task. Default splits the members evenly across the
+        worker processes.
+
+    Returns
+    -------
+    list
+        Results of every block, in member order.
+    """
+    with SharedEnsemblePool(values, axis=axis, processes=processes) as pool:
+        return pool.map(func, *args, chunk=chunk, **kwargs)
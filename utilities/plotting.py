@@ -0,0 +1,81 @@
+"""Plotting helpers for large ensembles.
+
+This module provides a density-aggregated alternative to drawing every
+member-year of an ensemble as an individual marker. Points are binned into
+a 2-D histogram and drawn as a single raster, so render time and file size
+do not grow with ensemble size. It contains the following main functions:
+
+    * density_grid: Bin scattered points into a 2-D count grid.
+
+    * density_scatter: Draw scattered points as a density raster on a
+        matplotlib axis.
+"""
+
+import numpy as np
+
+
+def density_grid(x, y, bins=(150, 100), range=None):
+    """Bin scattered points into a 2-D count grid.
+
+    Parameters
+    ----------
+    x, y : array_like
+        Point coordinates of any (matching) shape, e.g. [time x run].
+        Non-finite points are ignored.
+    bins : int or tuple of int, optional
+        Number of bins along x and y. Default is (150, 100).
+    range : tuple, optional
+        ((xmin, xmax), (ymin, ymax)). Default is the extent of the data.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Counts [x bin x y bin], x edges and y edges.
+    """
+    x = np.ravel(np.asarray(x, dtype=float))
+    y = np.ravel(np.asarray(y, dtype=float))
+    valid = np.isfinite(x) & np.isfinite(y)
+    return np.histogram2d(x[valid], y[valid], bins=bins, range=range)
+
+
+def density_scatter(ax, x, y, bins=(150, 100), range=None, cmap='Greys',
+                    color='grey', label=None, log=True, **kwargs):
+    """Draw scattered points as a density raster.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        Axis to draw on.
+    x, y : array_like
+        Point coordinates of any (matching) shape, e.g. [time x run].
+    bins : int or tuple of int, optional
+        Number of bins along x and y. Default is (150, 100).
+    range : tuple, optional
+        ((xmin, xmax), (ymin, ymax)). Default is the extent of the data.
+    cmap : str, optional
+        Colormap of the counts. Default is 'Greys'.
+    color : str, optional
+        Color of the legend entry. Default is 'grey'.
+    label : str, optional
+        Legend label.
+    log : bool, optional
+        If True, use a logarithmic color scale. Default is True.
+    **kwargs
+        Passed to ax.imshow.
+
+    Returns
+    -------
+    matplotlib.image.AxesImage
+    """
+    from matplotlib.colors import LogNorm  # deferred, slow to import
+    counts, xedges, yedges = density_grid(x, y, bins=bins, range=range)
+    counts = np.ma.masked_equal(counts.T, 0)
+    image = ax.imshow(counts, origin='lower', aspect='auto',
+                      interpolation='nearest', cmap=cmap,
+                      extent=(xedges[0], xedges[-1], yedges[0], yedges[-1]),
+                      norm=LogNorm() if log else None, **kwargs)
+    if label is not None:
+        # imshow has no legend entry, use an empty proxy marker
+        ax.scatter([], [], s=10, facecolor=color, edgecolor=color,
+                   label=label)
+    return image
@@ -0,0 +1,95 @@
+"""Concurrent dataset prefetching.
+
+This module provides functions to load independent datasets concurrently
+in a thread pool, so that the start-up time of a script is bounded by the
+slowest file rather than by the sum of all loads. It contains the following
+main functions:
+
+    * prefetch: Submit dataset loaders to a thread pool and return their
+        futures immediately.
+
+    * load_all: Load datasets concurrently and return the results with
+        per-dataset timings.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _timed(loader, args, kwargs):
+    """Call loader and return its result with the elapsed seconds."""
+    start = time.perf_counter()
+    result = loader(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _normalize(request):
+    """Split a request into (loader, args, kwargs)."""
+    if callable(request):
+        return request, (), {}
+    loader, *rest = request
+    args = rest[0] if len(rest) > 0 else ()
+    kwargs = rest[1] if len(rest) > 1 else {}
+    return loader, tuple(args), dict(kwargs)
+
+
+def prefetch(requests, max_workers=None, executor=None):
+    """Submit dataset loaders to a thread pool.
+
+    Parameters
+    ----------
+    requests : dict
+        {name: request}, where request is a loader callable or a tuple
+        (loader, args) or (loader, args, kwargs), e.g.
+        {'lens2': lens.lens2_cchile_gridpoints}.
+    max_workers : int, optional
+        Number of threads. Default is one per request.
+    executor : concurrent.futures.Executor, optional
+        Executor to submit to. If given, max_workers is ignored and the
+        caller is responsible for shutting it down.
+
+    Returns
+    -------
+    dict of concurrent.futures.Future
+        {name: future}. Each future resolves to (result, seconds).
+    """
+    own = executor is None
+    if own:
+        executor = ThreadPoolExecutor(max_workers=max_workers or
+                                      max(len(requests), 1))
+    futures = {name: executor.submit(_timed, *_normalize(request))
+               for name, request in requests.items()}
+    if own:
+        # let running loads finish without blocking the caller
+        executor.shutdown(wait=False)
+    return futures
+
+
+def load_all(requests, max_workers=None, verbose=True):
+    """Load datasets concurrently.
+
+    Parameters
+    ----------
+    requests : dict
+        {name: request}, see prefetch.
+    max_workers : int, optional
+        Number of threads. Default is one per request.
+    verbose : bool, optional
+        If True, print the load time of each dataset and the total wall
+        time.
+
+    Returns
+    -------
+    tuple of dict
+        Results {name: dataset} and timings {name: seconds}.
+    """
+    start = time.perf_counter()
+    futures = prefetch(requests, max_workers=max_workers)
+    results, timings = {}, {}
+    for name, future in futures.items():
+        results[name], timings[name] = future.result()
+    if verbose:
+        for name, seconds in timings.items():
+            print(f'{name}: {seconds:.2f} s')
+        print(f'total wall time: {time.perf_counter() - start:.2f} s')
+    return results, timings
@@ -0,0 +1,254 @@
+"""Streaming quantile sketches.
+
+This module provides a mergeable KLL quantile sketch, so that quantiles of
+pooled ensemble distributions can be estimated from data streamed in
+chunks with a memory footprint that depends only on the sketch size k.
+It contains the following main class and functions:
+
+    * QuantileSketch: Mergeable KLL sketch with bounded rank error.
+
+    * period_sketches: Build one sketch per period (and optionally per run
+        or gridpoint) streaming the time axis of a DataArray in chunks.
+
+    * merge_sketches: Merge two arrays of sketches elementwise, e.g. the
+        results of different workers.
+
+    * sketch_quantiles: Query quantiles from an array of sketches.
+"""
+
+import numpy as np
+import xarray as xr
+
+
+class QuantileSketch:
+    """Mergeable KLL quantile sketch.
+
+    Items are kept in compactors of increasing weight. When a compactor
+    exceeds its capacity it is sorted and every other item, starting at a
+    random offset, is promoted to the next compactor with twice the weight.
+    Capacities decrease geometrically from the top compactor down, so the
+    sketch holds O(k) items regardless of the number of updates.
+
+    Parameters
+    ----------
+    k : int, optional
+        Capacity of the top compactor. The sketch holds about 3k items.
+        Default is 2000.
+
+    Notes
+    -----
+    The rank error is additive and uniform over q: the rank of an
+    estimated q quantile is within about 1.7/k of q (0.8 percentage
+    points for k=200, 0.1 for k=2000). Tail quantiles are therefore
+    relatively less accurate: with k=200 the rank of a 1% quantile can be
+    off by up to about 70% of its value (0.3% to 1.7%), with the default
+    k=2000 by about 10%. Use k of at least 2000 for 1-5% tails.
+    seed : int or np.random.Generator, optional
+        Seed of the compaction offsets.
+    """
+
+    __slots__ = ('k', 'n', 'levels', '_rng')
+
+    _C = 2/3
+
+    def __init__(self, k=2000, seed=None):
+        self.k = int(k)
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k*self._C**depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size <= self._capacity(level):
+                level += 1
+                continue
+            items = np.sort(items)
+            # keep one item at this level if the count is odd
+            keep = items[:items.size % 2]
+            pairs = items[items.size % 2:]
+            promoted = pairs[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level + 1] = np.concatenate(
+                [self.levels[level + 1], promoted])
+            # capacities change when a level is added, restart from bottom
+            level = 0
+
+    def update(self, values):
+        """Add values to the sketch. NaNs are ignored.
+
+        Parameters
+        ----------
+        values : array_like
+            Values of any shape.
+        """
+        values = np.ravel(np.asarray(values, dtype=float))
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.n += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Merge another sketch into this one.
+
+        Parameters
+        ----------
+        other : QuantileSketch
+            Sketch built with the same k.
+
+        Returns
+        -------
+        QuantileSketch
+            This sketch, updated in place.
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Estimate quantiles.
+
+        Parameters
+        ----------
+        q : float or array_like
+            Probabilities in [0, 1].
+
+        Returns
+        -------
+        float or np.ndarray
+            Estimated quantiles, NaN if the sketch is empty.
+        """
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan)[()]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(a.size, 2.0**h)
+                                  for h, a in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, weights = items[order], weights[order]
+        cumw = np.cumsum(weights)
+        position = (cumw - weights/2)/cumw[-1]
+        return np.interp(q, position, items)
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        size = sum(a.size for a in self.levels)
+        return f'<QuantileSketch k={self.k} n={self.n} items={size}>'
+
+
+def period_sketches(da, periods, by=(), chunk=120, k=2000, seed=None):
+    """Build quantile sketches per period streaming the time axis.
+
+    Only one time chunk of da is loaded at a time, so da may be a lazy
+    (dask-backed) array from the lens loaders.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Data. [time x ...]
+    periods : list of tuple
+        (ini_year, end_year) pairs, both years included.
+    by : tuple of str, optional
+        Dimensions kept separate, e.g. ('run',) for one sketch per member
+        or ('lat', 'lon') for one per gridpoint. Values are pooled over
+        every other dimension. Default pools everything.
+    chunk : int, optional
+        Number of time steps per chunk. Default is 120.
+    k : int, optional
+        Sketch size. The rank error is additive, about 1.7/k for every
+        quantile (see QuantileSketch). Default is 2000.
+    seed : int, optional
+        Seed of the compaction offsets.
+
+    Returns
+    -------
+    xr.DataArray
+        Sketches (object dtype). [period x by]
+    """
+    by = list(by)
+    pooled = [d for d in da.dims if d != 'time' and d not in by]
+    da = da.transpose('time', *pooled, *by)
+    shape = tuple(da.sizes[d] for d in by)
+    nkey = int(np.prod(shape))
+    years = da.time.dt.year.values
+    seeds = np.random.SeedSequence(seed).spawn(len(periods)*nkey)
+    sketches = np.empty((len(periods), nkey), dtype=object)
+    for i, seq in enumerate(seeds):
+        sketches.flat[i] = QuantileSketch(k=k, seed=seq)
+
+    for start in range(0, years.size, chunk):
+        block_years = years[start:start + chunk]
+        block = None
+        for p, (ini, end) in enumerate(periods):
+            inside = (block_years >= int(ini)) & (block_years <= int(end))
+            if not inside.any():
+                continue
+            if block is None:
+                block = np.asarray(da.isel(time=slice(start, start + chunk))
+                                   .values).reshape(block_years.size, -1,
+                                                    nkey)
+            values = block[inside]
+            for key in range(nkey):
+                sketches[p, key].update(values[:, :, key])
+
+    coords = {'period': [f'{ini}-{end}' for ini, end in periods]}
+    coords.update({d: da[d].values for d in by if d in da.coords})
+    return xr.DataArray(sketches.reshape((len(periods),) + shape),
+                        coords=coords, dims=['period'] + by)
+
+
+def merge_sketches(a, b):
+    """Merge two arrays of sketches elementwise.
+
+    Parameters
+    ----------
+    a, b : xr.DataArray
+        Sketch arrays with the same dimensions, e.g. built by different
+        workers from different members or time chunks.
+
+    Returns
+    -------
+    xr.DataArray
+        Merged sketches (a is updated in place).
+    """
+    a, b = xr.align(a, b, join='exact')
+    for sa, sb in zip(a.values.flat, b.values.flat):
+        sa.merge(sb)
+    return a
+
+
+def sketch_quantiles(sketches, q):
+    """Query quantiles from an array of sketches.
+
+    Parameters
+    ----------
+    sketches : xr.DataArray
+        Sketch array as returned by period_sketches.
+    q : float or array_like
+        Probabilities in [0, 1].
+
+    Returns
+    -------
+    xr.DataArray
+        Quantiles. [quantile x ...]
+    """
+    q = np.atleast_1d(q)
+    values = np.array([s.quantile(q) for s in sketches.values.flat])
+    values = values.T.reshape((q.size,) + sketches.shape)
+    return xr.DataArray(values, coords={'quantile': q, **sketches.coords},
+                        dims=['quantile', *sketches.dims])
@@ -0,0 +1,157 @@
+"""Multi-year drought spell detection.
+
+This module provides vectorized run-length detection of drought spells,
+i.e. runs of consecutive years with precipitation below a threshold, over
+[time x run] ensembles. It contains the following main functions:
+
+    * spell_table: Find every drought spell below each threshold for every
+        run and return its onset, length and cumulative deficit as flat
+        arrays.
+
+    * drought_spells: Compute spell-length, cumulative-deficit and frequency
+        statistics per threshold, period and run in one pass.
+"""
+
+import numpy as np
+import xarray as xr
+
+
+def spell_table(data, thresholds):
+    """Find the drought spells of an ensemble for many thresholds at once.
+
+    A spell is a maximal run of consecutive time steps with values strictly
+    below the threshold. Run boundaries are found from the sign changes of
+    the padded below-threshold mask, so the whole [threshold x time x run]
+    cube is processed without Python loops.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Yearly values. [time x run]
+    thresholds : array_like
+        Thresholds in the same units as data. [threshold]
+
+    Returns
+    -------
+    dict of np.ndarray
+        One entry per spell with keys 'threshold' (threshold index), 'run'
+        (run index), 'onset' (time index of the first year), 'length'
+        (number of years) and 'deficit' (sum of threshold minus value over
+        the spell). [spell]
+    """
+    data = np.asarray(data, dtype=float)
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+    ntime, nrun = data.shape
+    nthr = thresholds.size
+
+    # time as the last axis so that np.nonzero yields spells grouped by
+    # (threshold, run) and sorted by time within each group
+    values = data.T[np.newaxis, :, :]  # 1 x run x time
+    limits = thresholds[:, np.newaxis, np.newaxis]  # threshold x 1 x 1
+    below = values < limits  # NaNs never count as dry
+    deficit = np.where(below, limits - values, 0.0)
+
+    padded = np.zeros((nthr, nrun, ntime + 2), dtype=np.int8)
+    padded[:, :, 1:-1] = below
+    edges = np.diff(padded, axis=-1)
+    thr_idx, run_idx, onset = np.nonzero(edges == 1)
+    _, _, stop = np.nonzero(edges == -1)
+
+    cumdef = np.zeros((nthr, nrun, ntime + 1))
+    np.cumsum(deficit, axis=-1, out=cumdef[:, :, 1:])
+    spell_deficit = (cumdef[thr_idx, run_idx, stop]
+                     - cumdef[thr_idx, run_idx, onset])
+
+    return {'threshold': thr_idx, 'run': run_idx, 'onset': onset,
+            'length': stop - onset, 'deficit': spell_deficit}
+
+
+def drought_spells(da, thresholds, periods, min_length=1):
+    """Compute drought spell statistics per threshold, period and run.
+
+    Each spell is counted in every period that contains its onset year, so
+    spells are detected once over the full record, never split at period
+    boundaries, and overlapping periods (e.g. 1921-2020 and 1971-2020) are
+    each counted in full.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Yearly precipitation. [time x run] or [time]
+    thresholds : array_like
+        Precipitation thresholds (same units as da). [threshold]
+    periods : list of tuple
+        (ini_year, end_year) pairs, both years included.
+    min_length : int, optional
+        Minimum spell length in years to be counted. Use 2 to keep only
+        multi-year droughts. Default is 1.
+
+    Returns
+    -------
+    xr.Dataset
+        Statistics with dimensions [threshold x period x run]:
+        n_spells (number of spells), frequency (spells per year of period),
+        dry_years (years within counted spells), mean_length, max_length
+        (years), mean_deficit and max_deficit (cumulative deficit of the
+        average and most severe spell, same units as da).
+    """
+    has_run = 'run' in da.dims
+    if not has_run:
+        da = da.expand_dims(run=[0], axis=1)
+    da = da.transpose('time', 'run')
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+    years = da.time.dt.year.values
+    nthr, nper, nrun = thresholds.size, len(periods), da.run.size
+
+    table = spell_table(da.values, thresholds)
+    onset_year = years[table['onset']]
+    keep = table['length'] >= min_length
+
+    # spells whose onset falls in each period [period x spell]
+    ini = np.array([ini for ini, _ in periods])[:, np.newaxis]
+    end = np.array([end for _, end in periods])[:, np.newaxis]
+    in_period = (onset_year >= ini) & (onset_year <= end) & keep
+    period_idx, spell_idx = np.nonzero(in_period)
+
+    flat = np.ravel_multi_index(
+        (table['threshold'][spell_idx], period_idx, table['run'][spell_idx]),
+        (nthr, nper, nrun))
+    length = table['length'][spell_idx]
+    deficit = table['deficit'][spell_idx]
+    size = nthr * nper * nrun
+
+    n_spells = np.bincount(flat, minlength=size)
+    dry_years = np.bincount(flat, weights=length, minlength=size)
+    sum_deficit = np.bincount(flat, weights=deficit, minlength=size)
+    max_length = np.zeros(size)
+    np.maximum.at(max_length, flat, length)
+    max_deficit = np.zeros(size)
+    np.maximum.at(max_deficit, flat, deficit)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_length = np.where(n_spells > 0, dry_years/n_spells, 0.0)
+        mean_deficit = np.where(n_spells > 0, sum_deficit/n_spells, 0.0)
+
+    nyears = np.array([end - ini + 1 for ini, end in periods])
+    shape = (nthr, nper, nrun)
+    n_spells = n_spells.reshape(shape)
+
+    dims = ['threshold', 'period', 'run']
+    coords = {'threshold': thresholds,
+              'period': [f'{ini}-{end}' for ini, end in periods],
+              'run': da.run.values,
+              'ini_year': ('period', [ini for ini, _ in periods]),
+              'end_year': ('period', [end for _, end in periods])}
+    ds = xr.Dataset({
+        'n_spells': (dims, n_spells),
+        'frequency': (dims, n_spells/nyears[np.newaxis, :, np.newaxis]),
+        'dry_years': (dims, dry_years.reshape(shape)),
+        'mean_length': (dims, mean_length.reshape(shape)),
+        'max_length': (dims, max_length.reshape(shape)),
+        'mean_deficit': (dims, mean_deficit.reshape(shape)),
+        'max_deficit': (dims, max_deficit.reshape(shape)),
+    }, coords=coords)
+    ds.attrs['min_length'] = min_length
+    if not has_run:
+        ds = ds.squeeze('run', drop=True)
+    return ds
@@ -1,12 +1,159 @@
+"""Station precipitation data access functions.
+
+This module provides functions to access observed precipitation from the
+DGA/DMC station network. Station CSV files hold one row per year with a
+FECHA column and one column per month (ENE to DIC). It contains the
+following main functions:
+
+    * yearly_precip_QN_1866_2022: Access the yearly precipitation at Quinta
+        Normal from 1866 to 2022.
+
+    * station_network: Access the monthly precipitation of many stations as
+        a single [time x station] array, cached in a binary netCDF file.
+
+    * hydrological_year_sum: Aggregate monthly precipitation into
+        hydrological (or calendar) years for all stations at once.
+"""
+
+import os
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-import xarray as xr 
+import xarray as xr
+
+MONTHS = ['ENE', 'FEB', 'MAR', 'ABR', 'MAY', 'JUN', 'JUL', 'AGO', 'SEP',
+          'OCT', 'NOV', 'DIC']
+
 
 def yearly_precip_QN_1866_2022():
     bd = '/home/tcarrasco/result/data/QN/'
     fn = 'SANTIAGO_QN_1866_2020_RENE_ext_2022.csv'
-    df = pd.read_csv(bd+fn, delimiter=",", decimal=".", index_col=None, header=0, parse_dates=['FECHA'])
-    months = ['ENE', 'FEB', 'MAR', 'ABR', 'MAY', 'JUN', 'JUL', 'AGO', 'SEP', 'OCT', 'NOV', 'DIC']
-    df_sum = df[months].sum(axis=1)
+    df = pd.read_csv(bd+fn, delimiter=",", decimal=".", index_col=None,
+                     header=0, usecols=['FECHA']+MONTHS,
+                     parse_dates=['FECHA'])
+    df_sum = df[MONTHS].sum(axis=1)
     coords = {'time': df['FECHA']}
-    da = xr.DataArray(df_sum, coords=coords) 
-    return da 
\ No newline at end of file
+    da = xr.DataArray(df_sum, coords=coords)
+    return da
+
+
+def _read_station_csv(filepath):
+    """Read the years and monthly values of a station CSV file.
+
+    Parameters
+    ----------
+    filepath : str
+        Station CSV file.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Years [year] and monthly precipitation [year x month].
+    """
+    df = pd.read_csv(filepath, delimiter=",", decimal=".", header=0,
+                     usecols=['FECHA']+MONTHS,
+                     dtype=dict(dict.fromkeys(MONTHS, 'float32'),
+                                FECHA='str'))
+    years = pd.to_datetime(df['FECHA'], cache=True).dt.year.values
+    return years, df[MONTHS].to_numpy()
+
+
+def _cache_is_valid(cachefile, filepaths):
+    """Check that a cache file exists and is newer than its sources."""
+    if not os.path.exists(cachefile):
+        return False
+    with xr.open_dataset(cachefile) as ds:
+        if 'station_file' not in ds:
+            return False
+        cached = list(ds['station_file'].values)
+    if cached != [os.path.basename(f) for f in filepaths]:
+        return False
+    cache_mtime = os.path.getmtime(cachefile)
+    return all(os.path.getmtime(f) <= cache_mtime for f in filepaths)
+
+
+def station_network(filepaths=None, cachefile=None, refresh=False,
+                    max_workers=8):
+    """Access the monthly precipitation of a network of stations.
+
+    Station CSV files are read in parallel, keeping only the FECHA and
+    monthly columns with explicit dtypes, and placed on a common monthly
+    time axis. The result is cached as a float32 netCDF file and read back
+    from it while no source file is newer than the cache.
+
+    Parameters
+    ----------
+    filepaths : list of str, optional
+        Station CSV files. Default is every CSV file in the stations
+        directory. The station name is the file name without extension.
+    cachefile : str, optional
+        Binary cache file. Default is stations_monthly.nc in the stations
+        directory.
+    refresh : bool, optional
+        If True, rebuild the cache even if it is up to date.
+    max_workers : int, optional
+        Number of threads used to read the CSV files. Default is 8.
+
+    Returns
+    -------
+    xr.DataArray
+        Monthly precipitation in mm/month. [time x station]
+    """
+    basedir = '/home/tcarrasco/result/data/stations/'
+    if filepaths is None:
+        filepaths = glob(basedir + '*.csv')
+    filepaths = sorted(filepaths)
+    if cachefile is None:
+        cachefile = basedir + 'stations_monthly.nc'
+
+    if not refresh and _cache_is_valid(cachefile, filepaths):
+        with xr.open_dataset(cachefile) as ds:
+            return ds['pr'].load()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tables = list(executor.map(_read_station_csv, filepaths))
+
+    ini_year = min(years.min() for years, _ in tables)
+    end_year = max(years.max() for years, _ in tables)
+    nyear = end_year - ini_year + 1
+    data = np.full((nyear, 12, len(tables)), np.nan, dtype='float32')
+    for k, (years, values) in enumerate(tables):
+        data[years - ini_year, :, k] = values
+
+    stations = [os.path.splitext(os.path.basename(f))[0] for f in filepaths]
+    time = pd.date_range(f'{ini_year}-01-01', periods=nyear*12, freq='MS')
+    da = xr.DataArray(data.reshape(nyear*12, len(tables)),
+                      coords={'time': time, 'station': stations},
+                      dims=['time', 'station'], name='pr',
+                      attrs={'units': 'mm/month'})
+    ds = da.to_dataset()
+    ds['station_file'] = ('station', [os.path.basename(f) for f in filepaths])
+    ds.to_netcdf(cachefile, encoding={'pr': {'zlib': True, 'complevel': 1}})
+    return da
+
+
+def hydrological_year_sum(da, start_month=4):
+    """Aggregate monthly precipitation into hydrological years.
+
+    Years are labelled by the calendar year in which they start, so with
+    the default April start, year 2000 spans April 2000 to March 2001.
+    Years with any missing month, including incomplete years at the ends
+    of the record, are NaN.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Monthly precipitation. [time x ...]
+    start_month : int, optional
+        First month of the hydrological year. Use 1 for calendar years.
+        Default is 4 (April).
+
+    Returns
+    -------
+    xr.DataArray
+        Yearly precipitation in mm/year. [time x ...]
+    """
+    time = da.time.to_index().shift(-(start_month - 1), freq='MS')
+    da = da.assign_coords(time=time)
+    return da.resample(time='1YS').sum(min_count=12)
@@ -0,0 +1,200 @@
+"""Parameter sensitivity sweeps.
+
+This module provides a small engine to evaluate an analysis over a grid
+of parameters in parallel, computing shared upstream stages (loaded data,
+transfer fits, corrected ensembles) only once, and to collect the results
+into one labelled dataset. It contains the following main functions:
+
+    * stage: Decorator that memoizes an upstream stage so that concurrent
+        combinations sharing its arguments compute it once.
+
+    * run_sweep: Evaluate a function over the cartesian product of
+        parameter values and collect the results in an xr.Dataset.
+
+    * hd_sensitivity: Sweep the choices of the frequency-change analysis
+        (calibration window, HD percentile, baseline period, bootstrap
+        sizes).
+"""
+
+import functools
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from utilities import bias_correction, frequency
+from utilities.ensemble import Ensemble
+
+
+def stage(func):
+    """Memoize a stage by its arguments, also across threads.
+
+    The first call with given arguments computes the result; concurrent
+    calls with the same arguments wait for it instead of recomputing.
+    Arguments must be hashable. The cache is exposed as func.cache.
+    """
+    cache = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        with lock:
+            future = cache.get(key)
+            owner = future is None
+            if owner:
+                future = cache[key] = Future()
+        if owner:
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as exc:
+                future.set_exception(exc)
+        return future.result()
+
+    wrapper.cache = cache
+    return wrapper
+
+
+def _label(value):
+    """Coordinate label of a parameter value."""
+    if isinstance(value, tuple):
+        return '-'.join(str(v) for v in value)
+    return value
+
+
+def run_sweep(evaluate, axes, max_workers=None):
+    """Evaluate a function over a parameter grid.
+
+    Parameters
+    ----------
+    evaluate : callable
+        Function called as evaluate(**params) for every combination. It
+        returns a dict of scalars or DataArrays (or an xr.Dataset) with the
+        same dimensions for every combination.
+    axes : dict
+        {parameter: list of values}. Tuple values are labelled 'a-b'.
+    max_workers : int, optional
+        Number of threads. Default is the ThreadPoolExecutor default.
+
+    Returns
+    -------
+    xr.Dataset
+        Results with one dimension per parameter followed by the result
+        dimensions.
+    """
+    names = list(axes)
+    combos = list(itertools.product(*axes.values()))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda values: xr.Dataset(evaluate(**dict(zip(names, values)))),
+            combos))
+    ds = xr.concat(results, dim='case', coords='minimal',
+                   compat='override')
+    index = pd.MultiIndex.from_tuples(
+        [tuple(_label(v) for v in values) for values in combos], names=names)
+    ds = ds.assign_coords(xr.Coordinates.from_pandas_multiindex(index,
+                                                                'case'))
+    return ds.unstack('case').transpose(*names, ...)
+
+
+def hd_sensitivity(obs, mod, calibration=((1921, 2020),), hd_percent=(5,),
+                   baseline=((1971, 2020),), bootstrap=((100, 100),),
+                   periods=((1921, 1970), (1971, 2020), (2021, 2070)),
+                   probs=np.arange(1, 25, 1), max_workers=None, seed=None):
+    """Sweep the parameters of the frequency-change analysis.
+
+    For every combination the modeled ensemble is corrected with the gamma
+    transfer fitted over the calibration window, the HD threshold is the
+    ensemble-mean hd_percent quantile over the baseline period, and
+    frequencies and deficits (wrt. the observed baseline mean) are
+    computed per period. Observed frequencies are NaN for periods not
+    fully covered by observations. Corrections and thresholds shared by
+    several combinations are computed once.
+
+    Parameters
+    ----------
+    obs : xr.DataArray
+        Observed yearly precipitation. [time]
+    mod : xr.DataArray
+        Modeled yearly precipitation. [time x run]
+    calibration : list of tuple, optional
+        Calibration windows of the transfer function.
+    hd_percent : list of int, optional
+        HD thresholds as percent frequency.
+    baseline : list of tuple, optional
+        Baseline periods of the threshold and reference mean.
+    bootstrap : list of tuple, optional
+        (nboot, nsample) bootstrap sizes.
+    periods : list of tuple, optional
+        Periods where frequency and intensity are evaluated.
+    probs : array_like, optional
+        Frequencies (%) of the intensity vs. frequency curve.
+    max_workers : int, optional
+        Number of threads.
+    seed : int, optional
+        Seed of the bootstrap.
+
+    Returns
+    -------
+    xr.Dataset
+        hd_threshold, hd_frequency, hd_frequency_obs, hd_intensity and
+        intensity (intensity vs. frequency curve, ensemble mean), with
+        dimensions [calibration x hd_percent x baseline x bootstrap x
+        period (x prob)].
+    """
+    obs_ens = Ensemble.from_dataarray(obs)
+    probs = np.asarray(probs)
+
+    @stage
+    def corrected(cal):
+        params = bias_correction.fit_transfer(mod, obs, f'{cal[0]}',
+                                              f'{cal[1]}')
+        return Ensemble.from_dataarray(
+            bias_correction.apply_transfer(mod, params))
+
+    @stage
+    def obs_mean(base):
+        return np.nanmean(obs_ens.period(*base))
+
+    @stage
+    def threshold(cal, percent, base):
+        p = (percent - 1)/(100 - 1)
+        return frequency.invcdf_from_mod_ens(corrected(cal), p, *base).mean()
+
+    def evaluate(calibration, hd_percent, baseline, bootstrap):
+        ens = corrected(calibration)
+        th = threshold(calibration, hd_percent, baseline)
+        ref = obs_mean(baseline)
+        nboot, nsample = bootstrap
+        rng = np.random.default_rng(seed)
+        p_hd = (hd_percent - 1)/(100 - 1)
+        p_curve = (probs - 1)/(100 - 1)
+        freq, freq_obs, intensity, curve = [], [], [], []
+        for ini, end in periods:
+            freq.append(100*frequency.cdf_from_mod_ens(
+                ens, th, ini, end, nboot, nsample, rng).mean())
+            y_obs = obs_ens.period(ini, end)
+            if y_obs.shape[0] == end - ini + 1 and not np.isnan(y_obs).any():
+                freq_obs.append(100*frequency.cdf_from_obs(
+                    obs_ens, th, ini, end, nboot, nsample, rng))
+            else:
+                freq_obs.append(np.nan)
+            values = frequency.invcdf_from_mod_ens(ens, p_hd, ini, end)
+            intensity.append(np.mean(100*(1 - values/ref)))
+            values = frequency.invcdf_from_mod_ens(ens, p_curve, ini, end)
+            curve.append(np.mean(100*(1 - values/ref), axis=-1))
+        period_coords = {'period': [f'{ini}-{end}' for ini, end in periods]}
+        curve_coords = dict(period_coords, prob=probs)
+        return {
+            'hd_threshold': th,
+            'hd_frequency': xr.DataArray(freq, coords=period_coords),
+            'hd_frequency_obs': xr.DataArray(freq_obs, coords=period_coords),
+            'hd_intensity': xr.DataArray(intensity, coords=period_coords),
+            'intensity': xr.DataArray(np.array(curve), coords=curve_coords),
+        }
+
+    axes = {'calibration': list(calibration), 'hd_percent': list(hd_percent),
+            'baseline': list(baseline), 'bootstrap': list(bootstrap)}
+    return run_sweep(evaluate, axes, max_workers=max_workers)
@@ -0,0 +1,200 @@
+"""Global warming level indexing.
+
+This module provides functions to compute drought statistics at global
+warming levels (GWL) instead of calendar periods. The years where each
+level is reached are precomputed from the GMST of an ensemble (ensemble
+mean or per member), and the precipitation of every level and run is then
+gathered with one fancy-indexing operation. It contains the following main
+functions:
+
+    * warming_level_windows: First year where the running-mean GMST
+        anomaly reaches each level, and the window of years around it.
+
+    * gather_windows: Gather the precipitation of each level window for
+        every run.
+
+    * warming_level_statistics: HD frequency and intensity vs. frequency
+        statistics for all levels and runs.
+"""
+
+import numpy as np
+import xarray as xr
+
+from utilities import frequency
+from utilities.ensemble import Ensemble
+from utilities.frequency_maps import HD_PROB
+
+
+def warming_level_windows(gmst, levels=(1.5, 2.0, 3.0), window=20,
+                          baseline=(1850, 1900), offset=0.0):
+    """Compute the window of years where each warming level is reached.
+
+    A level is reached in the first year whose centered window-year running
+    mean GMST anomaly is greater or equal than the level. The window spans
+    window years centered on that year. For [time x run] GMST the
+    anomaly of each member is taken with respect to its own baseline mean.
+
+    The default 1850-1900 baseline is covered by LENS2 only. LENS1 starts
+    in 1920, so its levels need a later baseline plus the warming of that
+    baseline with respect to pre-industrial, e.g.
+
+    >>> warming_level_windows(lens1_annual_gmst_ensmean(),
+    ...                       baseline=(1920, 1950), offset=dT)
+
+    where dT is the 1920-1950 minus 1850-1900 GMST difference, e.g. from
+    LENS2 or an observational dataset.
+
+    Parameters
+    ----------
+    gmst : xr.DataArray
+        Annual GMST. [time] (e.g. lens2_annual_gmst_ensmean) or
+        [time x run] for per-member levels.
+    levels : list of float, optional
+        Warming levels in ºC. Default is (1.5, 2, 3).
+    window : int, optional
+        Number of years of each window. Default is 20.
+    baseline : tuple, optional
+        (ini_year, end_year) of the reference period. Default is 1850-1900.
+    offset : float, optional
+        Warming of the baseline period with respect to pre-industrial.
+        Default is 0.
+
+    Returns
+    -------
+    xr.Dataset
+        crossing_year, ini_year and end_year (-1 where the level or its
+        full window is not reached). [level] or [level x run]
+
+    Raises
+    ------
+    ValueError
+        If gmst (or any of its runs) has no data in the baseline period.
+    """
+    gmst = gmst.squeeze(drop=True)
+    has_run = 'run' in gmst.dims
+    if not has_run:
+        gmst = gmst.expand_dims(run=[0], axis=1)
+    gmst = gmst.transpose('time', 'run')
+    years = gmst.time.dt.year.values
+    # per-member baseline, so each run is an anomaly wrt. its own climate
+    ref = gmst.sel(time=slice(f'{baseline[0]}', f'{baseline[1]}')).mean(
+        'time')
+    if np.isnan(ref).any():
+        raise ValueError(f'gmst has no data in the baseline period '
+                         f'{baseline[0]}-{baseline[1]} (data cover '
+                         f'{years[0]}-{years[-1]})')
+    anom = (gmst - ref).values + offset
+
+    # centered running mean, NaN where the window is incomplete
+    half = window//2
+    cumsum = np.zeros((anom.shape[0] + 1, anom.shape[1]))
+    np.cumsum(anom, axis=0, out=cumsum[1:])
+    running = np.full(anom.shape, np.nan)
+    running[half:anom.shape[0] - window + half + 1] = (
+        cumsum[window:] - cumsum[:-window])/window
+
+    levels = np.asarray(levels, dtype=float)
+    reached = running[np.newaxis] >= levels[:, np.newaxis, np.newaxis]
+    first = np.argmax(reached, axis=1)  # level x run
+    valid = reached.any(axis=1)
+    crossing = np.where(valid, years[first], -1)
+    ini = np.where(valid, crossing - half, -1)
+    end = np.where(valid, ini + window - 1, -1)
+
+    dims = ['level', 'run']
+    ds = xr.Dataset({'crossing_year': (dims, crossing),
+                     'ini_year': (dims, ini),
+                     'end_year': (dims, end)},
+                    coords={'level': levels, 'run': gmst.run.values})
+    ds.attrs.update(window=window, baseline=f'{baseline[0]}-{baseline[1]}',
+                    offset=offset)
+    if not has_run:
+        ds = ds.squeeze('run', drop=True)
+    return ds
+
+
+def gather_windows(pr, windows):
+    """Gather the precipitation of each warming level window.
+
+    Parameters
+    ----------
+    pr : Ensemble or xr.DataArray
+        Yearly precipitation. [time x run]
+    windows : xr.Dataset
+        Windows as returned by warming_level_windows, per level or per
+        level and run.
+
+    Returns
+    -------
+    np.ndarray
+        Precipitation of each window, NaN where the level is not reached
+        within the record. [level x run x year]
+    """
+    if not isinstance(pr, Ensemble):
+        pr = Ensemble.from_dataarray(pr)
+    window = int(windows.attrs['window'])
+    ini = windows['ini_year'].values
+    if ini.ndim == 1:
+        ini = np.broadcast_to(ini[:, np.newaxis], (ini.size, pr.nrun))
+    start = ini - pr.year0
+    valid = (ini >= 0) & (start >= 0) & (start + window <= pr.nyear)
+    idx = np.where(valid, start, 0)[..., np.newaxis] + np.arange(window)
+    run = np.arange(pr.nrun)[np.newaxis, :, np.newaxis]
+    values = pr.values[idx, run].astype(float)
+    values[~valid] = np.nan
+    return values
+
+
+def warming_level_statistics(pr, windows, threshold=None, probs=None,
+                             reference=None):
+    """Compute drought statistics at warming levels for all runs.
+
+    Parameters
+    ----------
+    pr : Ensemble or xr.DataArray
+        Yearly precipitation. [time x run]
+    windows : xr.Dataset
+        Windows as returned by warming_level_windows.
+    threshold : float, optional
+        HD threshold. Default is the ensemble mean of the per-run 5% HD
+        quantile over 1971-2020, as in the frequency-change scripts.
+    probs : array_like, optional
+        Frequencies (%) of the intensity vs. frequency curve. Default is
+        1 to 24.
+    reference : float, optional
+        Reference mean precipitation of the deficits. Default is the
+        ensemble mean over 1971-2020.
+
+    Returns
+    -------
+    xr.Dataset
+        hd_frequency (%) [level x run], quantile (precipitation) and
+        deficit (% wrt. reference) [level x prob x run].
+    """
+    if not isinstance(pr, Ensemble):
+        pr = Ensemble.from_dataarray(pr)
+    present = pr.period(1971, 2020)
+    if threshold is None:
+        threshold = np.quantile(present, HD_PROB, axis=0).mean()
+    if reference is None:
+        reference = present.mean()
+    probs = np.arange(1, 25, 1) if probs is None else np.asarray(probs)
+
+    y = gather_windows(pr, windows)  # level x run x year
+    freq = 100*frequency.percentile_rank(y, threshold)
+    freq = np.where(np.isnan(y).any(axis=-1), np.nan, freq)
+    quantiles = np.moveaxis(
+        np.quantile(y, (probs - 1)/(100 - 1), axis=-1), 0, 1)
+
+    runs = np.arange(pr.nrun) if pr.runs is None else pr.runs
+    coords = {'level': windows.level.values, 'prob': probs, 'run': runs}
+    ds = xr.Dataset({
+        'hd_frequency': (['level', 'run'], freq),
+        'quantile': (['level', 'prob', 'run'], quantiles),
+        'deficit': (['level', 'prob', 'run'],
+                    100*(1 - quantiles/reference)),
+    }, coords=coords)
+    ds['hd_frequency'].attrs['units'] = '%'
+    ds['deficit'].attrs['units'] = '%'
+    ds.attrs['hd_threshold'] = threshold
+    return ds
@@ -16,35 +16,42 @@ import matplotlib.font_manager as font_manager
 
 sys.path.append('/home/tcarrasco/result/repo/extreme-drought/')
 
-from utilities import lens, rpi, gmst 
+from utilities import lens, observations, climatology, prefetch, plotting
+
+# ensemble rendering: 'scatter' draws every member-year as a marker,
+# 'density' draws a 2-D histogram raster whose cost does not depend on
+# the ensemble size
+RENDER_MODE = 'scatter'
 
 # access data
-obs_rpi1 = rpi.rpi_timeseries()['rpi1']
-obs_rpi1_mean = obs_rpi1.sel(time=slice('1920', '2020')).mean()
-obs_rpi1_std = obs_rpi1.sel(time=slice('1920', '2020')).std()
-obs_rpi1 = (obs_rpi1-obs_rpi1_mean)/obs_rpi1_std
+data, _ = prefetch.load_all({
+    'obs': observations.observational_cube,
+    'lens1_cchile': lens.lens1_cchile_gridpoints,
+    'lens2_cchile': lens.lens2_cchile_gridpoints,
+    'lens1_tglobal': lens.lens1_annual_gmst_ensmean,
+    'lens2_tglobal': lens.lens2_annual_gmst_ensmean,
+})
+
+obs = data['obs']
+obs_rpi1 = obs['rpi1']
+obs_rpi1 = climatology.standardize(obs_rpi1, 'obs_rpi1', 1920, 2020)
 
-lens1_cchile = lens.lens1_cchile_gridpoints()
-lens1_cchile_mean = lens1_cchile.sel(time=slice('1920', '2020')).mean()
-lens1_cchile_std = lens1_cchile.sel(time=slice('1920', '2020')).std()
-lens1_cchile = (lens1_cchile-lens1_cchile_mean)/lens1_cchile_std
+lens1_cchile = data['lens1_cchile']
+lens1_cchile = climatology.standardize(lens1_cchile, 'lens1_cchile', 1920, 2020)
 
-lens2_cchile = lens.lens2_cchile_gridpoints()
-lens2_cchile_mean = lens2_cchile.sel(time=slice('1920', '2020')).mean()
-lens2_cchile_std = lens2_cchile.sel(time=slice('1920', '2020')).std()
-lens2_cchile = (lens2_cchile-lens2_cchile_mean)/lens2_cchile_std
+lens2_cchile = data['lens2_cchile']
+lens2_cchile = climatology.standardize(lens2_cchile, 'lens2_cchile', 1920, 2020)
 
-obs_tglobal = gmst.annual_global_hadcrut_lowess_from_statsmodel()
-obs_tglobal_mean = obs_tglobal.sel(time=slice('2011', '2020')).mean()
-obs_tglobal_anom = obs_tglobal - obs_tglobal_mean 
+obs_tglobal = obs['hadcrut_lowess']
+obs_tglobal_anom = climatology.anomaly(obs_tglobal, 'obs_tglobal', 2011, 2020)
 
-lens1_tglobal = lens.lens1_annual_gmst_ensmean()
-lens1_tglobal_mean = lens1_tglobal.sel(time=slice('2011', '2020')).mean()
-lens1_tglobal_anom = lens1_tglobal - lens1_tglobal_mean
+lens1_tglobal = data['lens1_tglobal']
+lens1_tglobal_anom = climatology.anomaly(lens1_tglobal, 'lens1_tglobal',
+                                         2011, 2020)
 
-lens2_tglobal = lens.lens2_annual_gmst_ensmean()
-lens2_tglobal_mean = lens2_tglobal.sel(time=slice('2011', '2020')).mean()
-lens2_tglobal_anom = lens2_tglobal - lens2_tglobal_mean
+lens2_tglobal = data['lens2_tglobal']
+lens2_tglobal_anom = climatology.anomaly(lens2_tglobal, 'lens2_tglobal',
+                                         2011, 2020)
 
 # visualize data
 
@@ -66,8 +73,11 @@ plt.sca(axs[0])
 y = lens1_cchile  # time x run
 x = np.tile(lens1_tglobal_anom.values, (lens1_cchile.shape[1], 1)).T
 
-plt.scatter(x, y, s=10, facecolor='grey',
-            edgecolor='grey', label='LENS1', alpha=0.4)
+if RENDER_MODE == 'density':
+    plotting.density_scatter(plt.gca(), x, y, label='LENS1')
+else:
+    plt.scatter(x, y, s=10, facecolor='grey',
+                edgecolor='grey', label='LENS1', alpha=0.4)
 plt.scatter(obs_tglobal_anom, obs_rpi1, s=10, c='red', label='RPI1')
 plt.axhline(0, c='black', linestyle='--')
 plt.legend()
@@ -78,8 +88,11 @@ plt.xlabel('GMST smoothed anomaly (ºC) [2011-2020]')
 plt.sca(axs[1])
 y = lens2_cchile  # time x run
 x = np.tile(lens2_tglobal_anom.values, (lens2_cchile.shape[1], 1)).T
-plt.scatter(x, y, s=10, facecolor='grey',
-            edgecolor='grey', label='LENS2', alpha=0.4)
+if RENDER_MODE == 'density':
+    plotting.density_scatter(plt.gca(), x, y, label='LENS2')
+else:
+    plt.scatter(x, y, s=10, facecolor='grey',
+                edgecolor='grey', label='LENS2', alpha=0.4)
 plt.scatter(obs_tglobal_anom, obs_rpi1, s=10, c='red', label='RPI1')
 plt.axhline(0, c='black', linestyle='--')
 plt.legend()
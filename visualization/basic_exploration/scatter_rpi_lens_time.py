@@ -15,24 +15,29 @@ import matplotlib.font_manager as font_manager
 
 sys.path.append('/home/tcarrasco/result/repo/extreme-drought/')
 
-from utilities import lens, rpi 
+from utilities import lens, observations, climatology, prefetch, plotting
+
+# ensemble rendering: 'scatter' draws every member-year as a marker,
+# 'density' draws a 2-D histogram raster whose cost does not depend on
+# the ensemble size
+RENDER_MODE = 'scatter'
 
 # access data
-obs_rpi1 = rpi.rpi_timeseries()['rpi1']
-obs_rpi1_mean = obs_rpi1.sel(time=slice('1920', '2020')).mean()
-obs_rpi1_std = obs_rpi1.sel(time=slice('1920', '2020')).std()
-obs_rpi1 = (obs_rpi1-obs_rpi1_mean)/obs_rpi1_std
+data, _ = prefetch.load_all({
+    'obs': observations.observational_cube,
+    'lens1_cchile': lens.lens1_cchile_gridpoints,
+    'lens2_cchile': lens.lens2_cchile_gridpoints,
+})
+
+obs_rpi1 = data['obs']['rpi1']
+obs_rpi1 = climatology.standardize(obs_rpi1, 'obs_rpi1', 1920, 2020)
 obs_rpi1_p05 = obs_rpi1.sel(time=slice('1920', '2020')).quantile(0.05)
 
-lens1_cchile = lens.lens1_cchile_gridpoints()
-lens1_cchile_mean = lens1_cchile.sel(time=slice('1920', '2020')).mean()
-lens1_cchile_std = lens1_cchile.sel(time=slice('1920', '2020')).std()
-lens1_cchile = (lens1_cchile-lens1_cchile_mean)/lens1_cchile_std
+lens1_cchile = data['lens1_cchile']
+lens1_cchile = climatology.standardize(lens1_cchile, 'lens1_cchile', 1920, 2020)
 
-lens2_cchile = lens.lens2_cchile_gridpoints()
-lens2_cchile_mean = lens2_cchile.sel(time=slice('1920', '2020')).mean()
-lens2_cchile_std = lens2_cchile.sel(time=slice('1920', '2020')).std()
-lens2_cchile = (lens2_cchile-lens2_cchile_mean)/lens2_cchile_std
+lens2_cchile = data['lens2_cchile']
+lens2_cchile = climatology.standardize(lens2_cchile, 'lens2_cchile', 1920, 2020)
 
 # visualize data
 
@@ -57,8 +62,12 @@ x = np.tile(lens1_cchile.time.dt.year.values, (lens1_cchile.shape[1], 1)).T
 y_mean = y.mean(['run'])
 y_mean_time = y_mean.time.dt.year
 
-plt.scatter(x, y, s=10, facecolor='grey',
-            edgecolor='grey', label='LENS1', alpha=0.4)
+if RENDER_MODE == 'density':
+    plotting.density_scatter(plt.gca(), x, y, bins=(x.shape[0], 100),
+                             label='LENS1')
+else:
+    plt.scatter(x, y, s=10, facecolor='grey',
+                edgecolor='grey', label='LENS1', alpha=0.4)
 plt.scatter(obs_rpi1.time.dt.year, obs_rpi1, s=10, c='red', label='RPI1')
 plt.plot(y_mean_time, y_mean, c='fuchsia', label='LENS1 mean')
 plt.axhline(0, c='black', linestyle='--')
@@ -75,8 +84,12 @@ x = np.tile(lens2_cchile.time.dt.year.values, (lens2_cchile.shape[1], 1)).T
 y_mean = y.mean(['run'])
 y_mean_time = y_mean.time.dt.year
 
-plt.scatter(x, y, s=10, facecolor='grey',
-            edgecolor='grey', label='LENS2', alpha=0.4)
+if RENDER_MODE == 'density':
+    plotting.density_scatter(plt.gca(), x, y, bins=(x.shape[0], 100),
+                             label='LENS2')
+else:
+    plt.scatter(x, y, s=10, facecolor='grey',
+                edgecolor='grey', label='LENS2', alpha=0.4)
 plt.scatter(obs_rpi1.time.dt.year, obs_rpi1, s=10, c='red', label='RPI1')
 plt.plot(y_mean_time, y_mean, c='fuchsia', label='LENS2 mean')
 plt.axhline(0, c='black', linestyle='--')
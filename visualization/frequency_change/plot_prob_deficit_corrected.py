@@ -12,63 +12,32 @@ The script also plots the HD frequency and intensity for the corrected data.
 """
 
 import sys
+import contextlib
 import numpy as np
-import xarray as xr
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as font_manager
-from scipy import stats
-from scipy.stats import gamma
 
 sys.path.append('/home/tcarrasco/result/repo/extreme-drought/')
 
-from utilities import lens, stations  
+from utilities import lens, observations, bias_correction, parallel
+from utilities.ensemble import Ensemble
+from utilities.frequency import invcdf_from_mod_ens, cdf_from_mod_ens
+
+# worker processes of the HD frequency bootstrap (None evaluates the runs
+# in this process, which is faster for yearly data of ~100 runs)
+PROCESSES = None
 
 # access data
-obs_qn = stations.yearly_precip_QN_1866_2022()
+obs_qn = observations.observational_cube()['qn']
 obs_qn_mean = obs_qn.sel(time=slice('1971', '2020')).mean()
 mod_lens2 = lens.lens2_cchile_gridpoints()
 
-obs_qn_1921_2020 = obs_qn.sel(time=slice('1921', '2020')).values
-mod_lens2_1921_2020 = np.ravel(mod_lens2.sel(time=slice('1921', '2020')).values)
-
 # transfer function
-def transfer(z):
-    return gamma.ppf(gamma.cdf(z, *gamma.fit(mod_lens2_1921_2020, floc=0)), 
-                     *gamma.fit(obs_qn_1921_2020, floc=0))
-transfer_fun = np.vectorize(transfer)
-
-# p -> v
-def invcdf_from_mod_ens(mod_data, p, ini_year, end_year):
-    nrun = mod_data.run.size
-    values = np.zeros((nrun,))
-    for run in range(nrun):
-        y = mod_data.sel(run=run).sel(time=slice(f'{ini_year}', 
-                                                 f'{end_year}'))
-        values[run] = np.quantile(y, p)
-    return values
-
-# v -> p
-def cdf_from_mod_ens(mod_data, v, ini_year, end_year):
-    nrun = mod_data.run.size
-    probs = np.zeros((nrun,))
-    for run in range(nrun):
-        print(f'{run+1}/{nrun}')
-        y = mod_data.sel(run=run).sel(time=slice(f'{ini_year}', 
-                                                 f'{end_year}'))
-        ans = 0
-        for i in range(100):
-            pool = np.random.choice(y, size=(100,), replace=True)
-            ans += stats.percentileofscore(pool, v, kind='rank')/100
-        probs[run] = ans/100
-    return probs
+params = bias_correction.fit_transfer(mod_lens2, obs_qn, '1921', '2020')
 
 # correct data
-shape = mod_lens2.shape
-data = np.ravel(mod_lens2.values)
-corrected_data = transfer_fun(data)
-corrected_data_matrix = corrected_data.reshape(shape)
-mod_lens_corrected = xr.DataArray(corrected_data_matrix, 
-                                  coords=mod_lens2.coords)
+mod_lens_corrected = Ensemble.from_dataarray(
+    bias_correction.apply_transfer(mod_lens2, params))
 
 # Add every font at the specified location
 font_dir = ['/home/tcarrasco/result/fonts/Merriweather',
@@ -126,17 +95,28 @@ plt.legend()
 
 # HD frequency
 plt.sca(axs[1, 0])
+# corrected ensemble copied to shared memory once for all periods
+if PROCESSES:
+    pool_context = parallel.SharedEnsemblePool(mod_lens_corrected.values,
+                                               processes=PROCESSES)
+else:
+    pool_context = contextlib.nullcontext()
 k = 0
-for init, end, color, name in zip([1921, 1971, 2021], [1970, 2020, 2070], 
-                                  ['dodgerblue', 'grey', 'firebrick'], 
-                                  ['Past', 'Present', 'Future']):
-    probs = cdf_from_mod_ens(mod_lens_corrected, ac_threshold, init, end)*100
-    plt.boxplot(probs, positions=[k], widths=0.4, patch_artist=True, 
-                boxprops=dict(facecolor=color, color=color, alpha=0.1), 
-                vert=False, showmeans=True, meanline=True, 
-                meanprops=dict(color=color, linewidth=2, linestyle='solid'), 
-                medianprops=dict(color=color, linewidth=1, linestyle='--'))               
-    k = k+1
+with pool_context as pool:
+    for init, end, color, name in zip([1921, 1971, 2021],
+                                      [1970, 2020, 2070],
+                                      ['dodgerblue', 'grey', 'firebrick'],
+                                      ['Past', 'Present', 'Future']):
+        probs = cdf_from_mod_ens(mod_lens_corrected, ac_threshold, init, end,
+                                 pool=pool)*100
+        plt.boxplot(probs, positions=[k], widths=0.4, patch_artist=True,
+                    boxprops=dict(facecolor=color, color=color, alpha=0.1),
+                    vert=False, showmeans=True, meanline=True,
+                    meanprops=dict(color=color, linewidth=2,
+                                   linestyle='solid'),
+                    medianprops=dict(color=color, linewidth=1,
+                                     linestyle='--'))
+        k = k+1
 plt.xlim(-0.5, 25)
 plt.ylim(-1, 3)  
 plt.yticks([0, 1, 2], ['Past', 'Present', 'Future'])
@@ -18,13 +18,11 @@ import matplotlib.font_manager as font_manager
 
 sys.path.append('/home/tcarrasco/result/repo/extreme-drought/')
 
-from utilities import lens, rpi  # pylint: disable=wrong-import-position
+from utilities import observations, climatology  # pylint: disable=wrong-import-position
 
 # access data
-obs_qn = rpi.rpi_timeseries()['qn']
-obs_qn_mean = obs_qn.sel(time=slice('1920', '2020')).mean()
-obs_qn_std = obs_qn.sel(time=slice('1920', '2020')).std()
-obs_qn = (obs_qn-obs_qn_mean)/obs_qn_std
+obs_qn = observations.observational_cube()['qn_rpi']
+obs_qn = climatology.standardize(obs_qn, 'obs_qn', 1920, 2020)
 
 q = (3-1)/(50-1)
 th = np.quantile(obs_qn.sel(time=slice('1973','2022')).values, q)